@@ -106,6 +106,51 @@ class EnvParam:
         load_param_str_config(section="llm", param_name="MAX_TOKEN_CONTEXT")
     )
 
+    LLM_POOL_MAX_CONNECTIONS: int = int(
+        load_param_str_config(section="llm", param_name="LLM_POOL_MAX_CONNECTIONS")
+    )
+
+    LLM_POOL_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        load_param_str_config(
+            section="llm", param_name="LLM_POOL_MAX_KEEPALIVE_CONNECTIONS"
+        )
+    )
+
+    LLM_POOL_KEEPALIVE_EXPIRY: float = float(
+        load_param_str_config(section="llm", param_name="LLM_POOL_KEEPALIVE_EXPIRY")
+    )
+
+    LLM_CACHE_SIZE: int = int(
+        load_param_str_config(section="llm", param_name="LLM_CACHE_SIZE")
+    )
+
+    LLM_CACHE_DB_PATH: Optional[str] = str(
+        load_param_str_config(section="llm", param_name="LLM_CACHE_DB_PATH")
+    )
+
+    if LLM_CACHE_DB_PATH == "None":
+        LLM_CACHE_DB_PATH = None
+
+    EXPANSION_MEMORY_SIZE: int = int(
+        load_param_str_config(section="llm", param_name="EXPANSION_MEMORY_SIZE")
+    )
+
+    EXPANSION_SIMILARITY: float = float(
+        load_param_str_config(section="llm", param_name="EXPANSION_SIMILARITY")
+    )
+
+    EXPANSION_KEYWORD_MAX_WORDS: int = int(
+        load_param_str_config(section="llm", param_name="EXPANSION_KEYWORD_MAX_WORDS")
+    )
+
+    QUERY_PLAN_DEPLOYMENTS: list[str] = [
+        deployment.strip()
+        for deployment in load_param_str_config(
+            section="llm", param_name="QUERY_PLAN_DEPLOYMENTS"
+        ).split(",")
+        if deployment.strip()
+    ]
+
     EMBEDDINGS_MODEL_OPEN_AI: str = str(
         load_param_str_config(
             section="embeddings", param_name="EMBEDDINGS_MODEL_OPEN_AI"
@@ -148,6 +193,16 @@ class EnvParam:
         load_param_str_config(section="embeddings", param_name="FAISS_DB_PATH")
     )
 
+    FAISS_DB_MAX_SIZE_MB: int = int(
+        load_param_str_config(section="embeddings", param_name="FAISS_DB_MAX_SIZE_MB")
+    )
+
+    FAISS_DB_MAX_AGE_HOURS: int = int(
+        load_param_str_config(
+            section="embeddings", param_name="FAISS_DB_MAX_AGE_HOURS"
+        )
+    )
+
     DOC_RAG_PATH: str = str(
         load_param_str_config(section="embeddings", param_name="DOC_RAG_PATH")
     )
@@ -160,6 +215,86 @@ class EnvParam:
         load_param_str_config(section="embeddings", param_name="CHUNK_SIZE")
     )
 
+    SIMHASH_MAX_DISTANCE: int = int(
+        load_param_str_config(section="embeddings", param_name="SIMHASH_MAX_DISTANCE")
+    )
+
+    EMBEDDINGS_CACHE_SIZE: int = int(
+        load_param_str_config(section="embeddings", param_name="EMBEDDINGS_CACHE_SIZE")
+    )
+
+    EMBEDDINGS_CACHE_DB_PATH: Optional[str] = str(
+        load_param_str_config(
+            section="embeddings", param_name="EMBEDDINGS_CACHE_DB_PATH"
+        )
+    )
+
+    if EMBEDDINGS_CACHE_DB_PATH == "None":
+        EMBEDDINGS_CACHE_DB_PATH = None
+
+    EMBEDDINGS_CACHE_FLOAT16: bool = bool(
+        True
+        if load_param_str_config(
+            section="embeddings", param_name="EMBEDDINGS_CACHE_FLOAT16"
+        )
+        in {"True", "true"}
+        else False
+    )
+
+    SPACY_MODEL: str = str(
+        load_param_str_config(section="splitter", param_name="SPACY_MODEL")
+    )
+
+    SPACY_BATCH_SIZE: int = int(
+        load_param_str_config(section="splitter", param_name="SPACY_BATCH_SIZE")
+    )
+
+    SPACY_N_PROCESS: int = int(
+        load_param_str_config(section="splitter", param_name="SPACY_N_PROCESS")
+    )
+
+    SPACY_FAST_MODE_MIN_CHARS: int = int(
+        load_param_str_config(
+            section="splitter", param_name="SPACY_FAST_MODE_MIN_CHARS"
+        )
+    )
+
+    CHUNK_OVERLAP: int = int(
+        load_param_str_config(section="splitter", param_name="CHUNK_OVERLAP")
+    )
+
+    CLEAN_SLICE_CHARS: int = int(
+        load_param_str_config(section="splitter", param_name="CLEAN_SLICE_CHARS")
+    )
+
+    DOCUMENTS_NB_WORKERS: int = int(
+        load_param_str_config(section="documents", param_name="DOCUMENTS_NB_WORKERS")
+    )
+
+    DOCUMENT_MAX_SIZE_MB: int = int(
+        load_param_str_config(section="documents", param_name="DOCUMENT_MAX_SIZE_MB")
+    )
+
+    DOCUMENT_TIMEOUT: int = int(
+        load_param_str_config(section="documents", param_name="DOCUMENT_TIMEOUT")
+    )
+
+    PDF_MIN_PAGES_BY_WORKER: int = int(
+        load_param_str_config(
+            section="documents", param_name="PDF_MIN_PAGES_BY_WORKER"
+        )
+    )
+
+    PDF_EXTRACTION_MODE: str = str(
+        load_param_str_config(section="documents", param_name="PDF_EXTRACTION_MODE")
+    )
+
+    PDF_HEADER_SAMPLE_PAGES: int = int(
+        load_param_str_config(
+            section="documents", param_name="PDF_HEADER_SAMPLE_PAGES"
+        )
+    )
+
     CONTENT_VECTOR: str = str(
         load_param_str_config(section="azure_search", param_name="CONTENT_VECTOR")
     )
@@ -172,6 +307,69 @@ class EnvParam:
         load_param_str_config(section="azure_search", param_name="METADTA")
     )
 
+    KEY_FIELD_SHAREPOINT: Optional[str] = str(
+        load_param_str_config(section="azure_search", param_name="KEY_FIELD_SHAREPOINT")
+    )
+
+    if KEY_FIELD_SHAREPOINT == "None":
+        KEY_FIELD_SHAREPOINT = None
+
+    KEY_FIELD_MAIL: Optional[str] = str(
+        load_param_str_config(section="azure_search", param_name="KEY_FIELD_MAIL")
+    )
+
+    if KEY_FIELD_MAIL == "None":
+        KEY_FIELD_MAIL = None
+
+    KEY_FIELD_GLPI: Optional[str] = str(
+        load_param_str_config(section="azure_search", param_name="KEY_FIELD_GLPI")
+    )
+
+    if KEY_FIELD_GLPI == "None":
+        KEY_FIELD_GLPI = None
+
+    MAX_CONCURRENT_SEARCH: int = int(
+        load_param_str_config(
+            section="azure_search", param_name="MAX_CONCURRENT_SEARCH"
+        )
+    )
+
+    DOCUMENT_CATALOG_REFRESH_SECONDS: float = float(
+        load_param_str_config(
+            section="azure_search", param_name="DOCUMENT_CATALOG_REFRESH_SECONDS"
+        )
+    )
+
+    DOCUMENT_CATALOG_TIMEOUT: float = float(
+        load_param_str_config(
+            section="azure_search", param_name="DOCUMENT_CATALOG_TIMEOUT"
+        )
+    )
+
+    ANSWER_CACHE_SIZE: int = int(
+        load_param_str_config(section="answer_cache", param_name="ANSWER_CACHE_SIZE")
+    )
+
+    ANSWER_CACHE_TTL_SECONDS: int = int(
+        load_param_str_config(
+            section="answer_cache", param_name="ANSWER_CACHE_TTL_SECONDS"
+        )
+    )
+
+    ANSWER_CACHE_SIMILARITY: float = float(
+        load_param_str_config(
+            section="answer_cache", param_name="ANSWER_CACHE_SIMILARITY"
+        )
+    )
+
+    ANSWER_CACHE_DEPLOYMENTS: list[str] = [
+        deployment.strip()
+        for deployment in load_param_str_config(
+            section="answer_cache", param_name="ANSWER_CACHE_DEPLOYMENTS"
+        ).split(",")
+        if deployment.strip()
+    ]
+
     USER_INPUT_PARAM_NAME: str = str(
         load_param_str_config(
             section="json_payload", param_name="USER_INPUT_PARAM_NAME"
@@ -226,6 +424,51 @@ class EnvParam:
         load_param_str_config(section="google", param_name="SERPER_URL_PLACES")
     )
 
+    SERPER_MAX_CONNECTIONS: int = int(
+        load_param_str_config(section="google", param_name="SERPER_MAX_CONNECTIONS")
+    )
+
+    SERPER_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        load_param_str_config(
+            section="google", param_name="SERPER_MAX_KEEPALIVE_CONNECTIONS"
+        )
+    )
+
+    SERPER_KEEPALIVE_EXPIRY: float = float(
+        load_param_str_config(section="google", param_name="SERPER_KEEPALIVE_EXPIRY")
+    )
+
+    SERPER_MAX_CONCURRENT_REQUESTS: int = int(
+        load_param_str_config(
+            section="google", param_name="SERPER_MAX_CONCURRENT_REQUESTS"
+        )
+    )
+
+    SERPER_TIMEOUT: float = float(
+        load_param_str_config(section="google", param_name="SERPER_TIMEOUT")
+    )
+
+    SERPER_CACHE_SIZE: int = int(
+        load_param_str_config(section="google", param_name="SERPER_CACHE_SIZE")
+    )
+
+    SERPER_CACHE_TTL_SECONDS: float = float(
+        load_param_str_config(section="google", param_name="SERPER_CACHE_TTL_SECONDS")
+    )
+
+    SERPER_CACHE_STALE_SECONDS: float = float(
+        load_param_str_config(
+            section="google", param_name="SERPER_CACHE_STALE_SECONDS"
+        )
+    )
+
+    SERPER_CACHE_DB_PATH: Optional[str] = str(
+        load_param_str_config(section="google", param_name="SERPER_CACHE_DB_PATH")
+    )
+
+    if SERPER_CACHE_DB_PATH == "None":
+        SERPER_CACHE_DB_PATH = None
+
     AZURE_OPENAI_ENDPOINT: str = str(load_params_env_file(name="AZURE_OPENAI_ENDPOINT"))
 
     AZURE_OPENAI_API_KEY: str = str(load_params_env_file(name="AZURE_OPENAI_API_KEY"))
@@ -4,10 +4,20 @@ import json
 import traceback
 import certifi
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import ValidationError
 from modules import logger
 from modules.qa import QA
+from modules.embeddings import embeddings_handler
+from modules.answer_cache import answer_cache
+from modules.completion_cache import completion_cache
+from modules.llm_clients import llm_client_registry
+from modules.serper_client import serper_client
+from modules.document_catalog import document_catalog
+from modules.documents import get_process_pool, shutdown_process_pool
+from modules.sentences import sentence_segmenter
 from modules.input_params import (
     InputParams,
     InputParamsChat,
@@ -24,7 +34,24 @@ os.environ["REQUESTS_CA_BUNDLE"] = certifi.where()
 
 # Add debugging statement to print the loaded environment variable
 print("AZURE_OPENAI_API_KEY:", os.getenv("AZURE_OPENAI_API_KEY"))
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared clients at startup and close them at shutdown"""
+    llm_client_registry.start()
+    serper_client.start()
+    document_catalog.start()
+    get_process_pool()
+    sentence_segmenter.load()
+    yield
+    await document_catalog.aclose()
+    await llm_client_registry.aclose()
+    await serper_client.aclose()
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Set up basic logging
 logging.basicConfig(level=logging.INFO)
@@ -38,6 +65,8 @@ async def chat(request: Request):
         req_body = await request.json()
         input_params = InputParamsChat.model_validate(req_body)
         qa = QA(input_params=input_params)
+        if input_params.stream:
+            return StreamingResponse(qa.run_stream(), media_type="text/event-stream")
         response = await qa.run()
         return response
     except ValidationError as e:
@@ -57,6 +86,8 @@ async def document(request: Request):
         req_body = await request.json()
         input_params = InputParams.model_validate(req_body)
         qa = QA(input_params=input_params)
+        if input_params.stream:
+            return StreamingResponse(qa.run_stream(), media_type="text/event-stream")
         response = await qa.run()
         return response
     except ValidationError as e:
@@ -76,6 +107,8 @@ async def sharepoint(request: Request):
         req_body = await request.json()
         input_params = InputParams.model_validate(req_body)
         qa = QA(input_params=input_params)
+        if input_params.stream:
+            return StreamingResponse(qa.run_stream(), media_type="text/event-stream")
         response = await qa.run()
         return response
     except ValidationError as e:
@@ -95,6 +128,8 @@ async def web(request: Request):
         req_body = await request.json()
         input_params = InputParamsWeb.model_validate(req_body)
         qa = QA(input_params=input_params)
+        if input_params.stream:
+            return StreamingResponse(qa.run_stream(), media_type="text/event-stream")
         response = await qa.run()
         return response
     except ValidationError as e:
@@ -114,6 +149,8 @@ async def email(request: Request):
         req_body = await request.json()
         input_params = InputParamsEmail.model_validate(req_body)
         qa = QA(input_params=input_params)
+        if input_params.stream:
+            return StreamingResponse(qa.run_stream(), media_type="text/event-stream")
         response = await qa.run()
         return response
     except ValidationError as e:
@@ -133,6 +170,8 @@ async def glpi(request: Request):
         req_body = await request.json()
         input_params = InputParamsGLPI.model_validate(req_body)
         qa = QA(input_params=input_params)
+        if input_params.stream:
+            return StreamingResponse(qa.run_stream(), media_type="text/event-stream")
         response = await qa.run()
         return response
     except ValidationError as e:
@@ -144,6 +183,19 @@ async def glpi(request: Request):
         raise HTTPException(status_code=500, detail=str(error_trace))
 
 
+@app.get("/metrics")
+async def metrics():
+    """Cache and pool metrics endpoint"""
+    return {
+        "embeddings_cache": embeddings_handler.stats(),
+        "llm_clients": llm_client_registry.stats(),
+        "serper_client": serper_client.stats(),
+        "answer_cache": answer_cache.stats(),
+        "document_catalog": document_catalog.stats(),
+        "completion_cache": completion_cache.stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -6,8 +6,6 @@ import certifi
 
 import logging
 
-from modules.token_counter import TokenCounter
-
 os.environ["SSL_CERT_FILE"] = certifi.where()
 
 
@@ -25,5 +23,3 @@ class LoggerCustomAzure:
 logging.getLogger().setLevel(logging.INFO)
 
 logger = LoggerCustomAzure()
-
-token_counter = TokenCounter(token=0)
@@ -0,0 +1,197 @@
+"""Semantic cache of the answers, shared by all users of an index"""
+
+import re
+import copy
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from pydantic import BaseModel, ConfigDict
+
+from config.config import EnvParam
+
+from modules import logger
+from modules.cache import CacheStats, LruCache, hash_key
+from modules.distance import DistanceEngine
+from modules.embeddings import Embeddings, distance_engine
+
+embeddings = Embeddings()
+
+
+class AnswerCacheEntry(BaseModel):
+    """Results of one answered question"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    scope: str
+
+    index_name: str
+
+    index_version: str
+
+    question: str
+
+    vector: np.ndarray
+
+    results: Dict[str, Any]
+
+    created_at: float
+
+
+class AnswerCache:
+    """Serve the answer of a similar question already asked on the same index"""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: int,
+        similarity_threshold: float,
+        distance_engine: DistanceEngine,
+    ) -> None:
+        self.entries = LruCache(max_size=max_size)
+
+        self.ttl_seconds: int = ttl_seconds
+
+        self.similarity_threshold: float = similarity_threshold
+
+        self.distance_engine: DistanceEngine = distance_engine
+
+        self.index_versions: Dict[str, str] = {}
+
+        self.stats_counter = CacheStats()
+
+    def normalize_question(self, question: str) -> str:
+        """Lower case and collapse spaces so trivial variations share a vector"""
+
+        return re.sub(r"\s+", " ", question).strip().lower()
+
+    def get_scope(self, *parts: str) -> str:
+        """Key of the partition a question can be served from"""
+
+        return hash_key(*parts)
+
+    def get_index_version(self, index_name: str) -> str:
+        """Current version of an index"""
+
+        return self.index_versions.get(index_name, "0")
+
+    def set_index_version(self, index_name: str, version: str) -> None:
+        """Change the version of an index, dropping all its answers"""
+
+        if self.index_versions.get(index_name) == version:
+            return
+
+        self.index_versions[index_name] = version
+
+        for entry in self.entries.values():
+            if entry.index_name == index_name:
+                self.entries.delete(hash_key(entry.scope, entry.question))
+
+        logger.info("Answer cache invalidated for index %s", index_name)
+
+    def is_valid(self, entry: AnswerCacheEntry) -> bool:
+        """Entry not expired and built on the current index version"""
+
+        return (
+            time.time() - entry.created_at < self.ttl_seconds
+            and entry.index_version == self.get_index_version(entry.index_name)
+        )
+
+    async def embed_question(self, question: str) -> np.ndarray:
+        """Vector of the normalized question"""
+
+        vectors: List[np.ndarray] = await embeddings.embedding_vectors(
+            texts=[self.normalize_question(question=question)]
+        )
+
+        return vectors[0]
+
+    def get(self, scope: str, vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Results of the most similar question of the scope, None if too far"""
+
+        entries: List[AnswerCacheEntry] = []
+
+        for entry in self.entries.values():
+            if entry.scope != scope:
+                continue
+
+            if self.is_valid(entry=entry):
+                entries.append(entry)
+
+            else:
+                self.entries.delete(hash_key(entry.scope, entry.question))
+
+        if len(entries) == 0:
+            self.stats_counter.misses += 1
+
+            return None
+
+        similarities: np.ndarray = 1.0 - self.distance_engine.cosine_distance_matrix(
+            vectors_1=[vector], vectors_2=[entry.vector for entry in entries]
+        )[0]
+
+        best_index: int = int(np.argmax(similarities))
+
+        if similarities[best_index] < self.similarity_threshold:
+            self.stats_counter.misses += 1
+
+            return None
+
+        self.stats_counter.hits += 1
+
+        best_entry: AnswerCacheEntry = entries[best_index]
+
+        logger.info(
+            "Answer cache hit with question %s, similarity %f",
+            best_entry.question,
+            similarities[best_index],
+        )
+
+        return copy.deepcopy(best_entry.results)
+
+    def set(
+        self,
+        scope: str,
+        index_name: str,
+        question: str,
+        vector: np.ndarray,
+        results: Dict[str, Any],
+    ) -> None:
+        """Store the results of an answered question"""
+
+        question = self.normalize_question(question=question)
+
+        self.entries.set(
+            hash_key(scope, question),
+            AnswerCacheEntry(
+                scope=scope,
+                index_name=index_name,
+                index_version=self.get_index_version(index_name=index_name),
+                question=question,
+                vector=self.distance_engine.to_storage(vector),
+                results=copy.deepcopy(results),
+                created_at=time.time(),
+            ),
+        )
+
+    def stats(self) -> dict:
+        """Cache counters, used to tune the threshold"""
+
+        return {
+            "size": len(self.entries),
+            "max_size": self.entries.max_size,
+            "similarity_threshold": self.similarity_threshold,
+            "index_versions": self.index_versions,
+            "hits": self.stats_counter.hits,
+            "misses": self.stats_counter.misses,
+            "evictions": self.entries.stats.evictions,
+        }
+
+
+answer_cache = AnswerCache(
+    max_size=EnvParam.ANSWER_CACHE_SIZE,
+    ttl_seconds=EnvParam.ANSWER_CACHE_TTL_SECONDS,
+    similarity_threshold=EnvParam.ANSWER_CACHE_SIMILARITY,
+    distance_engine=distance_engine,
+)
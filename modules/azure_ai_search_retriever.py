@@ -0,0 +1,122 @@
+"""Shared multi-query retrieval engine for the Azure AI Search indexes"""
+
+import asyncio
+from typing import Callable, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+from azure.search.documents.aio import SearchClient
+from azure.search.documents.models import (
+    QueryType,
+    QueryCaptionType,
+    QueryAnswerType,
+    VectorizedQuery,
+)
+
+from config.config import EnvParam
+
+from modules import logger
+from modules.cache import hash_key
+from modules.embeddings import Embeddings
+
+embeddings = Embeddings()
+
+
+class AzureAISearchRetriever:
+    """Embed all queries in one call, then search them concurrently"""
+
+    def __init__(
+        self,
+        search_client: SearchClient,
+        index_name: str,
+        select: list[str],
+        create_metadata: Callable[[dict], dict],
+        key_field: Optional[str] = None,
+    ) -> None:
+        self.search_client: SearchClient = search_client
+
+        self.index_name: str = index_name
+
+        self.key_field: Optional[str] = key_field
+
+        self.select: list[str] = select + ([key_field] if key_field else [])
+
+        self.create_metadata: Callable[[dict], dict] = create_metadata
+
+    async def search(
+        self, query: str, vector: list[float], semaphore: asyncio.Semaphore
+    ) -> list[Tuple[str, Document, float]]:
+        """Search one query, return (chunk id, chunk, score)"""
+
+        chunks: list[Tuple[str, Document, float]] = []
+
+        vector_query = VectorizedQuery(
+            vector=vector,
+            k_nearest_neighbors=3,
+            fields=EnvParam.CONTENT_VECTOR,
+            exhaustive=True,
+        )
+
+        try:
+            async with semaphore:
+                results = await self.search_client.search(
+                    search_text=query,
+                    vector_queries=[vector_query],
+                    select=self.select,
+                    query_type=QueryType.SEMANTIC,
+                    semantic_configuration_name=f"{self.index_name}_semantic_config",
+                    query_caption=QueryCaptionType.EXTRACTIVE,
+                    query_answer=QueryAnswerType.EXTRACTIVE,
+                    top=3,
+                )
+
+                async for result in results:
+                    chunk = Document(
+                        page_content=result[EnvParam.CONTENT],
+                        metadata=self.create_metadata(result),
+                    )
+
+                    chunk_id: str = (
+                        self.key_field and result.get(self.key_field)
+                    ) or hash_key(chunk.page_content)
+
+                    chunks.append((chunk_id, chunk, result["@search.reranker_score"]))
+
+        except Exception as e:
+            logger.error(
+                "Error searching %s for query %s => %s", self.index_name, query, e
+            )
+
+        return chunks
+
+    async def get_chunks(self, list_queries: list[str]) -> list[Tuple[Document, float]]:
+        """Function that get chunks for all queries, deduplicated by chunk id"""
+
+        vectors: list[list[float]] = await embeddings.embedding_documents(
+            texts=list_queries
+        )
+
+        semaphore = asyncio.Semaphore(EnvParam.MAX_CONCURRENT_SEARCH)
+
+        results: list[list[Tuple[str, Document, float]]] = await asyncio.gather(
+            *[
+                self.search(query=query, vector=vector, semaphore=semaphore)
+                for query, vector in zip(list_queries, vectors)
+            ]
+        )
+
+        chunks_by_id: dict[str, Tuple[Document, float]] = {}
+
+        for query_results in results:
+            for chunk_id, chunk, score in query_results:
+                if chunk_id not in chunks_by_id or score > chunks_by_id[chunk_id][1]:
+                    chunks_by_id[chunk_id] = (chunk, score)
+
+        logger.info(
+            "Nb chunks from %s: %d for %d queries",
+            self.index_name,
+            len(chunks_by_id),
+            len(list_queries),
+        )
+
+        return list(chunks_by_id.values())
@@ -0,0 +1,147 @@
+"""Module with the shared cache tiers (in-process LRU and on-disk SQLite)"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+def hash_key(*parts: str) -> str:
+    """Create a stable content hash from several strings"""
+
+    hasher = hashlib.sha256()
+
+    for part in parts:
+        hasher.update(part.encode("utf-8"))
+
+        hasher.update(b"\0")
+
+    return hasher.hexdigest()
+
+
+class CacheStats(BaseModel):
+    """Counters of a cache, used to size it"""
+
+    hits: int = 0
+
+    disk_hits: int = 0
+
+    misses: int = 0
+
+    evictions: int = 0
+
+
+class LruCache:
+    """In-process LRU cache with hit/miss/eviction counters"""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size: int = max_size
+
+        self.items: OrderedDict[str, Any] = OrderedDict()
+
+        self.stats = CacheStats()
+
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get value from cache, None if missing"""
+
+        with self.lock:
+            if key not in self.items:
+                self.stats.misses += 1
+
+                return None
+
+            self.items.move_to_end(key)
+
+            self.stats.hits += 1
+
+            return self.items[key]
+
+    def set(self, key: str, value: Any) -> None:
+        """Add value to cache and evict the least recently used ones"""
+
+        with self.lock:
+            self.items[key] = value
+
+            self.items.move_to_end(key)
+
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+                self.stats.evictions += 1
+
+    def values(self) -> list[Any]:
+        """Snapshot of all values, without changing the LRU order"""
+
+        with self.lock:
+            return list(self.items.values())
+
+    def delete(self, key: str) -> None:
+        """Remove value from cache"""
+
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all values from cache"""
+
+        with self.lock:
+            self.items.clear()
+
+
+class SqliteCache:
+    """On-disk key/value cache stored in one SQLite table"""
+
+    def __init__(self, db_path: str, table: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self.table: str = table
+
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+
+        with self.lock:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+
+            self.connection.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Get value from disk, None if missing"""
+
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes) -> None:
+        """Write value to disk"""
+
+        with self.lock:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+            self.connection.commit()
+
+    def delete(self, key: str) -> None:
+        """Remove value from disk"""
+
+        with self.lock:
+            self.connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+            self.connection.commit()
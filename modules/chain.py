@@ -3,7 +3,7 @@
 import time
 import base64
 import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, AsyncIterator
 
 from langchain.prompts import ChatPromptTemplate
 
@@ -29,6 +29,7 @@ from modules.google import Google
 from modules.utils import window_token_reducer
 
 from modules.llm import (
+    Llm,
     create_chat_prompt,
     create_chat_prompt_new,
     llm_format,
@@ -59,13 +60,6 @@ else:
 
 logger.info("Distance limit Hallucination %f", DISTANCE_LIMIT_HALLUCINATION)
 
-if EnvParam.USE_GPT_4:
-    LIMIT_TOKEN_CONTEXT = 30000
-else:
-    LIMIT_TOKEN_CONTEXT = 3500
-
-logger.info("Limit token context %f", LIMIT_TOKEN_CONTEXT)
-
 
 output_formater = OutputFormater(
     html_folder_path="./html_output",
@@ -98,10 +92,10 @@ class Chain:
 
         self.input_params = input_params
 
-    def create_documents(self, documents: Documents) -> None:
+    async def create_documents(self, documents: Documents) -> None:
         """Create documents from base 64"""
 
-        documents.create_documents()
+        await documents.create_documents()
 
         if len(documents.documents_list) == 0:
             logger.warning("No document created")
@@ -113,25 +107,8 @@ class Chain:
 
         await self.context.get_context()
 
-    def create_json_response(
-        self,
-        user_input: str,
-        answer_html: str,
-        answer_raw: str,
-        answer_formated: str,
-        context_chunks: list[ContextChunk],
-        memory_list: Optional[list[dict[str, str]]],
-        follow_up_question: list[str],
-    ) -> dict:
-        """Create the json to sendback from API"""
-
-        if memory_list:
-            chat_history: List[Dict[str, str]] = memory_list + [
-                {"question": user_input, "answer": answer_raw}
-            ]
-
-        else:
-            chat_history = [{"question": user_input, "answer": answer_raw}]
+    def create_references(self, context_chunks: list[ContextChunk]) -> list[dict]:
+        """Create the references of the chunks used in answer"""
 
         references: list[dict] = []
 
@@ -176,6 +153,28 @@ class Chain:
 
                 references.append(source)
 
+        return references
+
+    def create_json_response(
+        self,
+        user_input: str,
+        answer_html: str,
+        answer_raw: str,
+        answer_formated: str,
+        references: list[dict],
+        memory_list: Optional[list[dict[str, str]]],
+        follow_up_question: list[str],
+    ) -> dict:
+        """Create the json to sendback from API"""
+
+        if memory_list:
+            chat_history: List[Dict[str, str]] = memory_list + [
+                {"question": user_input, "answer": answer_raw}
+            ]
+
+        else:
+            chat_history = [{"question": user_input, "answer": answer_raw}]
+
         if self.context.queries:
             questions_generated: list[str] = self.context.queries.all_queries
 
@@ -253,10 +252,8 @@ class Chain:
 
         return response
 
-    async def get_raw_answer(self) -> str:
-        """Function asking Llm for raw answer (no format, no sources)"""
-
-        start_time = time.time()
+    def get_raw_answer_prompt(self) -> Tuple[Llm, ChatPromptTemplate]:
+        """Function creating the Llm and the prompt for raw answer"""
 
         if len(self.context.context) > 0:
             self.context.context = window_token_reducer(context=self.context.context)
@@ -284,23 +281,7 @@ class Chain:
                 context=None,
             )
 
-            try:
-                raw_answer_with_context: str = (
-                    await llm_raw_answer_with_context.inference(
-                        prompt=raw_answer_prompt_with_context
-                    )
-                )
-
-            except Exception as e:
-                logger.error("Error infering Llm raw answer with context, %s", e)
-
-                raw_answer_with_context = EnvParam.ERROR_MESSAGE + " (" + str(e) + ")"
-
-            logger.info("RAW ANSWER: %s", raw_answer_with_context)
-
-            logger.warning("Raw answer time %f", time.time() - start_time)
-
-            return raw_answer_with_context
+            return llm_raw_answer_with_context, raw_answer_prompt_with_context
 
         instruction: str = f"{self.user_input}"
 
@@ -313,8 +294,17 @@ class Chain:
 
         logger.info("RAW ANSWER PROMPT: %s", raw_answer_prompt)
 
+        return llm_raw_answer, raw_answer_prompt
+
+    async def get_raw_answer(self) -> str:
+        """Function asking Llm for raw answer (no format, no sources)"""
+
+        start_time = time.time()
+
+        llm, raw_answer_prompt = self.get_raw_answer_prompt()
+
         try:
-            raw_answer: str = await llm_raw_answer.inference(prompt=raw_answer_prompt)
+            raw_answer: str = await llm.inference(prompt=raw_answer_prompt)
 
         except Exception as e:
             logger.error("Error infering Llm raw answer, %s", e)
@@ -323,8 +313,28 @@ class Chain:
 
         logger.info("RAW ANSWER: %s", raw_answer)
 
+        logger.warning("Raw answer time %f", time.time() - start_time)
+
         return raw_answer
 
+    async def stream_raw_answer(self) -> AsyncIterator[str]:
+        """Function asking Llm for raw answer and yielding tokens as they arrive"""
+
+        start_time = time.time()
+
+        llm, raw_answer_prompt = self.get_raw_answer_prompt()
+
+        try:
+            async for token in llm.inference_stream(prompt=raw_answer_prompt):
+                yield token
+
+        except Exception as e:
+            logger.error("Error streaming Llm raw answer, %s", e)
+
+            yield EnvParam.ERROR_MESSAGE + " (" + str(e) + ")"
+
+        logger.warning("Raw answer time %f", time.time() - start_time)
+
     async def get_formated_answer(
         self,
         answer: str,
@@ -433,11 +443,32 @@ class Chain:
 
         return answer
 
+    def get_context_chunks_to_source(self) -> list[ContextChunk]:
+        """Context chunks that can be used as sources"""
+
+        if isinstance(self.context.chunk_retreiver, Google):
+            return self.context.context_list[:10]
+
+        return self.context.context_list
+
+    async def embed_context_chunks(self) -> None:
+        """Embed the context chunks ahead of sourcing, while answer is formated"""
+
+        if len(self.context.context) == 0:
+            return
+
+        try:
+            await embeddings.embedding_documents(
+                texts=[chunk.content for chunk in self.get_context_chunks_to_source()]
+            )
+
+        except Exception as e:
+            logger.error("Error embedding context chunks %s", e)
+
     async def get_sourced_answer(self, answer: str) -> str:
         """Function which source an answer with context"""
 
-        if isinstance(self.context.chunk_retreiver, Google):
-            self.context.context_list = self.context.context_list[:10]
+        self.context.context_list = self.get_context_chunks_to_source()
 
         sourcer = Sourcer(context=self.context)
 
@@ -0,0 +1,104 @@
+"""Exact-match cache of the Llm completions, keyed by the rendered prompt"""
+
+import json
+from typing import Any, Optional, Sequence
+
+from langchain.schema.messages import BaseMessage
+
+from config.config import EnvParam
+
+from modules import logger
+from modules.cache import LruCache, SqliteCache, hash_key
+
+
+class CompletionCache:
+    """Completions of deterministic Llm calls, in memory and optionally on disk"""
+
+    def __init__(self, max_size: int, db_path: Optional[str] = None) -> None:
+        self.memory_cache = LruCache(max_size=max_size)
+
+        self.disk_cache: Optional[SqliteCache] = None
+
+        self.saved_token: int = 0
+
+        if db_path:
+            try:
+                self.disk_cache = SqliteCache(db_path=db_path, table="completions")
+
+            except Exception as e:
+                logger.error("Error opening completion disk cache %s", e)
+
+    def get_key(
+        self,
+        messages: Sequence[BaseMessage],
+        model: str,
+        temperature: float,
+        output_format: str = "text",
+    ) -> str:
+        """Stable key of a rendered message list for a model and a temperature"""
+
+        return hash_key(
+            model,
+            repr(float(temperature)),
+            output_format,
+            json.dumps(
+                [(message.type, message.content) for message in messages],
+                ensure_ascii=False,
+            ),
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        """Completion from the memory tier then from the disk tier, None if missing"""
+
+        entry: Optional[dict] = self.memory_cache.get(key)
+
+        if entry is None and self.disk_cache:
+            raw_entry: Optional[bytes] = self.disk_cache.get(key)
+
+            if raw_entry is not None:
+                self.memory_cache.stats.disk_hits += 1
+
+                entry = json.loads(raw_entry)
+
+                self.memory_cache.set(key, entry)
+
+        if entry is None:
+            return None
+
+        self.saved_token += entry["nb_token"]
+
+        logger.info("Completion cache hit, token saved => %d", entry["nb_token"])
+
+        return entry
+
+    def set(self, key: str, result: Any, nb_token: int) -> None:
+        """Store a completion and the tokens it cost"""
+
+        entry: dict = {"result": result, "nb_token": nb_token}
+
+        self.memory_cache.set(key, entry)
+
+        if self.disk_cache:
+            try:
+                self.disk_cache.set(
+                    key, json.dumps(entry, ensure_ascii=False).encode("utf-8")
+                )
+
+            except Exception as e:
+                logger.error("Error writing completion disk cache %s", e)
+
+    def stats(self) -> dict:
+        """Cache counters, used to size the cache"""
+
+        return {
+            "size": len(self.memory_cache),
+            "max_size": self.memory_cache.max_size,
+            "is_disk_enabled": self.disk_cache is not None,
+            "saved_token": self.saved_token,
+            **self.memory_cache.stats.model_dump(),
+        }
+
+
+completion_cache = CompletionCache(
+    max_size=EnvParam.LLM_CACHE_SIZE, db_path=EnvParam.LLM_CACHE_DB_PATH
+)
@@ -13,6 +13,9 @@ from config.config import EnvParam
 from modules import logger
 from modules.queries import Queries
 from modules.embeddings import Embeddings
+from modules.request_context import get_request_context
+from modules.simhash import simhash, is_near_duplicate
+from modules.token_budget import token_count, token_counts
 from modules.doc_local_search import DocLocalSearch
 from modules.azure_ai_vector_search import AzureAIVectorSearch
 from modules.azure_ai_vector_search_email import AzureAIVectorSearchEmail
@@ -35,8 +38,36 @@ else:
     else:
         CHUNK_SCORE_LIMIT = EnvParam.CHUNK_SCORE_LIMIT_EMBEDDINGS_3
 
+LIMIT_TOKEN_CONTEXT_GPT_4 = 30000
+
+LIMIT_TOKEN_CONTEXT_GPT_3 = 3500
+
 embeddings = Embeddings()
 
+NON_PRINTABLE_PATTERN = re.compile(r"[^\x20-\x7E\n\r]+")
+
+SOURCE_SEPARATOR = "------------------------------"
+
+
+def create_source_header(document: str) -> str:
+    """Header put before the chunks of one document in the context"""
+
+    return f"Source from '{document}':\n{SOURCE_SEPARATOR}\n"
+
+
+SOURCE_FOOTER = f"\n{SOURCE_SEPARATOR}\n\n"
+
+CHUNK_JOINER = "\n\n"
+
+
+def get_limit_token_context(is_use_gpt_4: bool) -> int:
+    """Max tokens of context for the model of the request"""
+
+    if is_use_gpt_4:
+        return LIMIT_TOKEN_CONTEXT_GPT_4
+
+    return LIMIT_TOKEN_CONTEXT_GPT_3
+
 
 class ContextChunk(BaseModel):
     """One chunk for context"""
@@ -63,13 +94,15 @@ class ContextChunk(BaseModel):
 
     date_sent: Optional[str] = None
 
+    nb_token: int = 0
+
 
 class Context(BaseModel):
     """Class that get context from embeddings db"""
 
     context_list: list[ContextChunk] = []
 
-    doc_used: list[str] = []
+    doc_used: dict[str, None] = {}
 
     context: str = ""
 
@@ -162,91 +195,243 @@ class Context(BaseModel):
     def create_str_context(self) -> None:
         """Function that create string context from chunk"""
 
-        context: str = ""
+        chunks_by_doc: dict[str, list[ContextChunk]] = {
+            doc: [] for doc in self.doc_used
+        }
 
-        context_by_doc: dict = {}
+        for chunk in self.context_list:
+            chunks_by_doc.setdefault(chunk.document, []).append(chunk)
+
+        sorted_docs: list[Tuple[str, list[ContextChunk]]] = sorted(
+            chunks_by_doc.items(),
+            key=lambda x: max((chunk.similarity for chunk in x[1]), default=0.0),
+            reverse=True,
+        )
 
-        for doc in self.doc_used:
-            context_by_doc[doc] = {"content": "", "score": 0.0}
+        is_google: bool = isinstance(self.chunk_retreiver, Google)
 
-            for chunk in self.context_list:
-                if chunk.document == doc:
-                    context_by_doc[doc]["content"] = (
-                        context_by_doc[doc]["content"] + "\n\n" + chunk.content
-                    )
+        context_parts: list[str] = []
 
-                    if chunk.similarity > context_by_doc[doc]["score"]:
-                        context_by_doc[doc]["score"] = chunk.similarity
+        for doc, chunks in sorted_docs:
+            chunk_content: str = NON_PRINTABLE_PATTERN.sub(
+                "", "".join(CHUNK_JOINER + chunk.content for chunk in chunks)
+            )
+
+            if is_google:
+                context_parts.append(chunk_content)
+
+            else:
+                context_parts.append(
+                    create_source_header(document=doc) + chunk_content + SOURCE_FOOTER
+                )
+
+        self.context = "".join(context_parts)
+
+    def get_nb_token(self, docs: list[Document]) -> list[int]:
+        """Token count of each chunk as sent in context, from metadata if present"""
 
-        context_list = [
-            {"doc": doc, "content": info["content"], "score": info["score"]}
-            for doc, info in context_by_doc.items()
+        nb_tokens: list[Optional[int]] = [doc.metadata.get("nb_token") for doc in docs]
+
+        missing_indexes: list[int] = [
+            index for index, nb_token in enumerate(nb_tokens) if nb_token is None
         ]
 
-        sorted_context_list = sorted(
-            context_list, key=lambda x: x["score"], reverse=True
+        for index, nb_token in zip(
+            missing_indexes,
+            token_counts(
+                texts=[
+                    NON_PRINTABLE_PATTERN.sub("", docs[index].page_content)
+                    for index in missing_indexes
+                ]
+            ),
+        ):
+            nb_tokens[index] = nb_token
+
+        return [int(nb_token or 0) for nb_token in nb_tokens]
+
+    def get_token_budget(self) -> int:
+        """Max number of tokens of the chunks, as window_token_reducer would cut,
+        for the model of the request"""
+
+        limit_token_context: int = get_limit_token_context(
+            is_use_gpt_4=get_request_context().is_use_gpt_4
         )
 
-        for chunk in sorted_context_list:
-            try:
-                chunk_content: str = chunk["content"]
+        return int(min(EnvParam.MAX_TOKEN_CONTEXT, limit_token_context) - 10)
 
-                pattern = r"[^\x20-\x7E\n\r]+"
+    def get_header_nb_token(self, document: str) -> int:
+        """Token count added to the context by the first chunk of a document"""
 
-                chunk_content = re.sub(pattern, "", chunk_content)
+        if isinstance(self.chunk_retreiver, Google):
+            return 0
 
-                if isinstance(self.chunk_retreiver, Google):
-                    context += f"{chunk_content}"
+        return token_count(text=create_source_header(document=document) + SOURCE_FOOTER)
 
-                else:
-                    context += f"Source from '{chunk['doc']}':\n------------------------------\n{chunk_content}\n------------------------------\n\n"
+    def pack_chunks(
+        self, chunks: list[ContextChunk], max_chunks: int
+    ) -> list[ContextChunk]:
+        """Pick whole chunks by score per token to fill the token budget (knapsack),
+        returned by score then retrieval order"""
 
-            except Exception as e:
-                logger.info("Error adding one chunk to context :%s", e)
+        token_budget: int = self.get_token_budget()
+
+        header_nb_tokens: dict[str, int] = {
+            document: self.get_header_nb_token(document=document)
+            for document in dict.fromkeys(chunk.document for chunk in chunks)
+        }
+
+        def get_value(chunk: ContextChunk) -> float:
+            return chunk.similarity - CHUNK_SCORE_LIMIT
 
-        self.context = context
+        joiner_nb_token: int = token_count(text=CHUNK_JOINER)
+
+        def get_cost(chunk: ContextChunk) -> int:
+            return chunk.nb_token + joiner_nb_token + header_nb_tokens[chunk.document]
+
+        selected_chunks: list[ContextChunk] = []
+
+        documents: set[str] = set()
+
+        nb_token_used: int = 0
+
+        positions: dict[int, int] = {
+            id(chunk): position for position, chunk in enumerate(chunks)
+        }
+
+        def get_rank(chunk: ContextChunk) -> Tuple[float, int]:
+            return (-chunk.similarity, positions[id(chunk)])
+
+        if len({chunk.similarity for chunk in chunks}) == 1:
+            # same score for all (web results): keep the retrieval order
+            greedy_chunks: list[ContextChunk] = sorted(chunks, key=get_rank)
+
+        else:
+            greedy_chunks = sorted(
+                chunks,
+                key=lambda x: (
+                    -get_value(x) / max(get_cost(x), 1),
+                    positions[id(x)],
+                ),
+            )
+
+        for chunk in greedy_chunks:
+            if len(selected_chunks) >= max_chunks:
+                break
+
+            nb_token_needed: int = chunk.nb_token + joiner_nb_token
+
+            if chunk.document not in documents:
+                nb_token_needed += header_nb_tokens[chunk.document]
+
+            if nb_token_used + nb_token_needed > token_budget:
+                continue
+
+            selected_chunks.append(chunk)
+
+            documents.add(chunk.document)
+
+            nb_token_used += nb_token_needed
+
+        fitting_chunks: list[ContextChunk] = [
+            chunk for chunk in chunks if get_cost(chunk) <= token_budget
+        ]
+
+        if fitting_chunks and max_chunks > 0:
+            best_chunk: ContextChunk = max(fitting_chunks, key=get_value)
+
+            if get_value(best_chunk) > sum(
+                get_value(chunk) for chunk in selected_chunks
+            ):
+                selected_chunks = [best_chunk]
+
+                nb_token_used = get_cost(best_chunk)
+
+        selected_chunks = sorted(selected_chunks, key=get_rank)
+
+        for index, chunk in enumerate(selected_chunks, start=1):
+            chunk.index = index
+
+        logger.info(
+            "Packed %d chunks out of %d in %d tokens, budget %d",
+            len(selected_chunks),
+            len(chunks),
+            nb_token_used,
+            token_budget,
+        )
+
+        return selected_chunks
 
     def select_chunk(self, docs: list[Tuple[Document, float]]) -> None:
-        """Select chunk according to the score limit"""
+        """Select chunk according to the score limit, without duplicates"""
 
         sorted_docs = sorted(docs, key=lambda x: x[1], reverse=True)
 
         logger.info("Chunk score limit %f", CHUNK_SCORE_LIMIT)
 
-        context_content: list[str] = []
+        request_context = get_request_context()
+
+        seen_contents: set[str] = set()
+
+        seen_fingerprints: list[int] = []
+
+        candidates: list[Tuple[Document, float]] = []
 
         for doc in sorted_docs:
-            try:
-                if (
-                    doc[1] > CHUNK_SCORE_LIMIT
-                    and doc[0].page_content not in context_content
-                ):
-                    logger.info("ADD CONTEXT with score %f", doc[1])
-
-                    self.context_list.append(
-                        ContextChunk(
-                            index=len(self.context_list) + 1,
-                            content=doc[0].page_content,
-                            similarity=doc[1],
-                            document=doc[0].metadata["file_name"],
-                            url=doc[0].metadata.get("source_url"),
-                            sender=doc[0].metadata.get("sender"),
-                            cced=doc[0].metadata.get("cced"),
-                            bcced=doc[0].metadata.get("bcced"),
-                            has_attachment=doc[0].metadata.get("has_attachment"),
-                            date_sent=doc[0].metadata.get("date_sent"),
-                        )
-                    )
+            if doc[1] <= CHUNK_SCORE_LIMIT:
+                break
+
+            if doc[0].page_content in seen_contents:
+                continue
+
+            seen_contents.add(doc[0].page_content)
+
+            fingerprint: int = simhash(text=doc[0].page_content)
+
+            if is_near_duplicate(
+                fingerprint=fingerprint,
+                fingerprints=seen_fingerprints,
+                max_distance=EnvParam.SIMHASH_MAX_DISTANCE,
+            ):
+                logger.info("Skip near duplicate chunk with score %f", doc[1])
+
+                continue
 
-                    context_content.append(doc[0].page_content)
+            seen_fingerprints.append(fingerprint)
 
-                    if doc[0].metadata["file_name"] not in self.doc_used:
-                        self.doc_used.append(doc[0].metadata["file_name"])
+            candidates.append(doc)
 
-                if len(self.context_list) >= EnvParam.NB_CHUNK_FOR_CONTEXT:
-                    break
+        nb_tokens: list[int] = self.get_nb_token(docs=[doc for doc, _ in candidates])
+
+        context_chunks: list[ContextChunk] = []
+
+        for doc, nb_token in zip(candidates, nb_tokens):
+            try:
+                context_chunks.append(
+                    ContextChunk(
+                        index=len(context_chunks) + 1,
+                        content=doc[0].page_content,
+                        similarity=doc[1],
+                        document=doc[0].metadata["file_name"],
+                        url=doc[0].metadata.get("source_url"),
+                        sender=doc[0].metadata.get("sender"),
+                        cced=doc[0].metadata.get("cced"),
+                        bcced=doc[0].metadata.get("bcced"),
+                        has_attachment=doc[0].metadata.get("has_attachment"),
+                        date_sent=doc[0].metadata.get("date_sent"),
+                        nb_token=nb_token,
+                    )
+                )
 
             except Exception as e:
                 logger.error("Error adding chunk : %s", e)
 
+        self.context_list = self.pack_chunks(
+            chunks=context_chunks, max_chunks=request_context.nb_chunk_for_context
+        )
+
+        for chunk in self.context_list:
+            logger.info("ADD CONTEXT with score %f", chunk.similarity)
+
+            self.doc_used[chunk.document] = None
+
         logger.warning("Nb chunk for context %d", len(self.context_list))
@@ -0,0 +1,45 @@
+"""Module computing cosine distances on already computed vectors"""
+
+from typing import List, Union
+
+import numpy as np
+
+
+Vectors = Union[np.ndarray, List[List[float]]]
+
+
+class DistanceEngine:
+    """Cosine distances for one pair or whole matrices with NumPy"""
+
+    def __init__(self, is_float16: bool = False) -> None:
+        self.storage_dtype = np.float16 if is_float16 else np.float32
+
+    def to_storage(self, vector: Union[np.ndarray, List[float]]) -> np.ndarray:
+        """Convert one vector to the storage dtype (float32 or float16)"""
+
+        return np.asarray(vector, dtype=self.storage_dtype)
+
+    def normalize(self, vectors: Vectors) -> np.ndarray:
+        """L2 normalized float32 matrix, one vector by row"""
+
+        matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def cosine_distance(
+        self,
+        vector_1: Union[np.ndarray, List[float]],
+        vector_2: Union[np.ndarray, List[float]],
+    ) -> float:
+        """Cosine distance beetween two vectors"""
+
+        return float(self.cosine_distance_matrix(vector_1, vector_2)[0][0])
+
+    def cosine_distance_matrix(
+        self, vectors_1: Vectors, vectors_2: Vectors
+    ) -> np.ndarray:
+        """Cosine distance beetween each vector of vectors_1 and of vectors_2"""
+
+        return 1.0 - self.normalize(vectors_1) @ self.normalize(vectors_2).T
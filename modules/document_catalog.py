@@ -0,0 +1,172 @@
+"""Background-refreshed catalog of the SharePoint documents in blob storage"""
+
+import asyncio
+from typing import Optional
+from xml.etree import ElementTree
+
+import httpx
+
+from config.config import EnvParam
+
+from modules import logger
+from modules.cache import hash_key
+from modules.answer_cache import answer_cache
+
+
+class DocumentCatalog:
+    """Snapshot of the blob names, read by requests without waiting on storage"""
+
+    def __init__(
+        self, endpoint: str, index_name: str, refresh_seconds: float, timeout: float
+    ) -> None:
+        self.endpoint: str = endpoint
+
+        self.index_name: str = index_name
+
+        self.refresh_seconds: float = refresh_seconds
+
+        self.timeout: float = timeout
+
+        self.documents_str: str = ""
+
+        self.nb_documents: int = 0
+
+        self.etag: Optional[str] = None
+
+        self.version: Optional[str] = None
+
+        self.http_client: Optional[httpx.AsyncClient] = None
+
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def get_documents_str(self) -> str:
+        """Current snapshot of the documents names"""
+
+        return self.documents_str
+
+    async def fetch_names(self) -> Optional[list[str]]:
+        """List all the blob names, following the pages, None if not modified"""
+
+        names: list[str] = []
+
+        marker: Optional[str] = None
+
+        etag: Optional[str] = None
+
+        while True:
+            headers: dict[str, str] = {}
+
+            if marker is None and self.etag:
+                headers["If-None-Match"] = self.etag
+
+            url: httpx.URL = httpx.URL(self.endpoint)
+
+            if marker:
+                url = url.copy_merge_params({"marker": marker})
+
+            response: httpx.Response = await self.http_client.get(url, headers=headers)
+
+            if response.status_code == 304:
+                return None
+
+            response.raise_for_status()
+
+            if marker is None:
+                etag = response.headers.get("ETag")
+
+            root = ElementTree.fromstring(response.content)
+
+            names += [
+                name.text for name in root.findall(".//Blob/Name") if name.text
+            ]
+
+            marker = root.findtext("NextMarker")
+
+            if not marker:
+                self.etag = etag
+
+                return names
+
+    async def refresh(self) -> None:
+        """Rebuild the snapshot when the listing changed"""
+
+        names: Optional[list[str]] = await self.fetch_names()
+
+        if names is None:
+            return
+
+        seen_names: set[str] = set()
+
+        unique_names: list[str] = []
+
+        for name in names:
+            if name not in seen_names:
+                seen_names.add(name)
+
+                unique_names.append(name)
+
+        version: str = hash_key(*unique_names)
+
+        if version == self.version:
+            return
+
+        self.documents_str = "".join(f"- {name}\n" for name in unique_names)
+
+        self.nb_documents = len(unique_names)
+
+        if self.version is not None:
+            answer_cache.set_index_version(index_name=self.index_name, version=version)
+
+        self.version = version
+
+        logger.warning("Document catalog refreshed, nb documents %d", self.nb_documents)
+
+    async def run(self) -> None:
+        """Refresh the snapshot on an interval"""
+
+        while True:
+            try:
+                await self.refresh()
+
+            except Exception as e:
+                logger.error("Error refreshing document catalog %s", e)
+
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self) -> None:
+        """Start the background refresh (app startup)"""
+
+        self.http_client = httpx.AsyncClient(timeout=self.timeout)
+
+        self.refresh_task = asyncio.create_task(self.run())
+
+    async def aclose(self) -> None:
+        """Stop the background refresh (app shutdown)"""
+
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+        self.refresh_task = None
+
+        self.http_client = None
+
+    def stats(self) -> dict:
+        """Catalog state"""
+
+        return {
+            "nb_documents": self.nb_documents,
+            "version": self.version,
+            "etag": self.etag,
+            "refresh_seconds": self.refresh_seconds,
+        }
+
+
+document_catalog = DocumentCatalog(
+    endpoint=EnvParam.BLOB_ENDPOINT,
+    index_name=EnvParam.AZURE_AI_SEARCH_INDEX_NAME_SHAREPOINT,
+    refresh_seconds=EnvParam.DOCUMENT_CATALOG_REFRESH_SECONDS,
+    timeout=EnvParam.DOCUMENT_CATALOG_TIMEOUT,
+)
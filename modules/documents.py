@@ -2,9 +2,14 @@
 
 import csv
 import base64
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 from io import StringIO
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 
 from pydantic import BaseModel
 
@@ -20,10 +25,145 @@ from docx.table import Table
 from pptx import Presentation
 
 from modules import logger
+from modules.pymupdf_rag import get_fontsizes, sample_pages, to_markdown
 
 from config.config import EnvParam
 
 
+PDF_MODE_TEXT = "text"
+
+PDF_MODE_MARKDOWN = "markdown"
+
+process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Pool of processes parsing the documents, created on first use"""
+
+    global process_pool
+
+    if process_pool is None:
+        process_pool = ProcessPoolExecutor(
+            max_workers=EnvParam.DOCUMENTS_NB_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return process_pool
+
+
+def shutdown_process_pool(
+    pool: Optional[ProcessPoolExecutor] = None, is_kill: bool = False
+) -> None:
+    """Stop the processes parsing the documents, killing them if a document
+    is stuck. A pool already replaced by a new one is left as is"""
+
+    global process_pool
+
+    if process_pool is None or (pool is not None and pool is not process_pool):
+        return
+
+    if is_kill:
+        # a running task can not be cancelled, only its process can be killed
+        for process in list(getattr(process_pool, "_processes", {}).values()):
+            process.kill()
+
+    process_pool.shutdown(wait=False, cancel_futures=True)
+
+    process_pool = None
+
+
+def extract_content(decoded_data: bytes, extension: Optional[str]) -> Optional[str]:
+    """Extract content from bytes, run in the process pool"""
+
+    return Documents(base64_documents=None).extract_content(
+        decoded_data=decoded_data, extension=extension
+    )
+
+
+def count_pdf_pages(pdf_bytes: bytes) -> int:
+    """Number of pages of a pdf, run in the process pool"""
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def get_pdf_fontsizes(pdf_bytes: bytes, pages: list[int]) -> dict[int, int]:
+    """Nb of chars by font size on some pages of a pdf, run in the process pool"""
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return get_fontsizes(doc, pages=pages)
+
+
+def extract_pdf_pages(
+    pdf_bytes: bytes,
+    first_page: int,
+    last_page: int,
+    fontsizes: Optional[dict[int, int]] = None,
+) -> list[str]:
+    """Text of the pages beetween first_page and last_page, as markdown when the
+    font sizes giving the headers are passed, run in the process pool"""
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if fontsizes is None:
+            return [
+                doc[page_number].get_text()
+                for page_number in range(first_page, last_page)
+            ]
+
+        return [
+            to_markdown(doc, pages=[page_number], fontsizes=fontsizes)
+            for page_number in range(first_page, last_page)
+        ]
+
+
+def is_pdf_markdown() -> bool:
+    """PDF are extracted as markdown with headers and tables, else as plain text"""
+
+    if EnvParam.PDF_EXTRACTION_MODE not in [PDF_MODE_TEXT, PDF_MODE_MARKDOWN]:
+        logger.error(
+            "Unknown pdf extraction mode %s, using %s",
+            EnvParam.PDF_EXTRACTION_MODE,
+            PDF_MODE_TEXT,
+        )
+
+    return EnvParam.PDF_EXTRACTION_MODE == PDF_MODE_MARKDOWN
+
+
+def get_page_ranges(nb_pages: int, nb_workers: int, min_pages: int) -> list[Tuple]:
+    """Contiguous page ranges, one by worker with at least min_pages pages"""
+
+    nb_ranges: int = max(1, min(nb_workers, nb_pages // max(min_pages, 1)))
+
+    bounds: list[int] = [
+        index * nb_pages // nb_ranges for index in range(nb_ranges + 1)
+    ]
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def join_pages(pages: list[str]) -> Tuple[str, list[int]]:
+    """Text of the pages in order and the char offset where each page starts"""
+
+    page_offsets: list[int] = []
+
+    offset: int = 0
+
+    for page in pages:
+        page_offsets.append(offset)
+
+        offset += len(page)
+
+    return "".join(pages), page_offsets
+
+
+class ExtractedContent(BaseModel):
+    """Text of a document and the char offset of each page, if paged"""
+
+    text: str
+
+    page_offsets: list[int] = []
+
+
 class Documents(BaseModel):
     """Class with all documents"""
 
@@ -33,15 +173,18 @@ class Documents(BaseModel):
 
     documents_names: str = ""
 
-    def create_documents(self) -> None:
-        """Create all documents to langchain docs"""
+    async def create_documents(self) -> None:
+        """Create all documents to langchain docs, parsed in parallel"""
 
         if self.base64_documents:
-            for document in self.base64_documents:
-                new_document: Optional[Document] = self.create_document(
-                    documents=document
-                )
+            new_documents: list[Optional[Document]] = await asyncio.gather(
+                *[
+                    self.create_document(documents=document)
+                    for document in self.base64_documents
+                ]
+            )
 
+            for new_document in new_documents:
                 if new_document:
                     self.documents_list.append(new_document)
 
@@ -49,7 +192,7 @@ class Documents(BaseModel):
 
         logger.info(f"User documents added:\n{self.documents_names}")
 
-    def create_document(self, documents: Dict[str, str]) -> Optional[Document]:
+    async def create_document(self, documents: Dict[str, str]) -> Optional[Document]:
         """Create one document"""
 
         try:
@@ -63,12 +206,36 @@ class Documents(BaseModel):
             if not metadata:
                 metadata = "Any file"
 
-            content: Optional[str] = self.base_64_to_txt(
-                base64_content=base64_content, metadata=metadata
+            decoded_data: Optional[bytes] = self.decode_base64(
+                base64_content=base64_content
             )
 
-            if content:
-                return Document(page_content=content, metadata={"file_name": metadata})
+            if not decoded_data:
+                return None
+
+            if len(decoded_data) > EnvParam.DOCUMENT_MAX_SIZE_MB * 1024 * 1024:
+                logger.error(
+                    "Document %s is too big (%d bytes)", metadata, len(decoded_data)
+                )
+
+                return None
+
+            content: Optional[ExtractedContent] = await self.bytes_to_txt(
+                decoded_data=decoded_data, metadata=metadata
+            )
+
+            if content and content.text:
+                document_metadata: dict = {
+                    "file_name": metadata,
+                    "document_hash": hashlib.sha256(decoded_data).hexdigest(),
+                }
+
+                if content.page_offsets:
+                    document_metadata["page_offsets"] = content.page_offsets
+
+                return Document(
+                    page_content=content.text, metadata=document_metadata
+                )
 
             logger.warning("Document %s is empty", metadata)
 
@@ -77,29 +244,156 @@ class Documents(BaseModel):
 
         return None
 
-    def base_64_to_txt(self, base64_content: str, metadata: str) -> Optional[str]:
-        """Convert base 64 to text from .txt, .pdf, and .docx files."""
+    def decode_base64(self, base64_content: str) -> Optional[bytes]:
+        """Decode base 64 content to bytes"""
 
         try:
             _, encoded_data = base64_content.split(",", 1)
 
-            decoded_data = base64.b64decode(encoded_data)
+            return base64.b64decode(encoded_data)
 
+        except Exception as e:
+            logger.error("Error decoding base64 %s", e)
+
+            return None
+
+    async def bytes_to_txt(
+        self, decoded_data: bytes, metadata: str
+    ) -> Optional[ExtractedContent]:
+        """Convert bytes to text from .txt, .pdf, and .docx files in the process pool"""
+
+        pool: ProcessPoolExecutor = get_process_pool()
+
+        try:
             extension = "." + metadata.split(".")[-1]
 
             logger.info("File found %s (%s)", metadata, extension)
 
-            text_content: Optional[str] = self.extract_content(
-                decoded_data=decoded_data, extension=extension
+            if extension == ".pdf":
+                return await asyncio.wait_for(
+                    self.pdf_to_txt(
+                        pdf_bytes=decoded_data, metadata=metadata, pool=pool
+                    ),
+                    timeout=EnvParam.DOCUMENT_TIMEOUT,
+                )
+
+            loop = asyncio.get_running_loop()
+
+            text_content: Optional[str] = await asyncio.wait_for(
+                loop.run_in_executor(pool, extract_content, decoded_data, extension),
+                timeout=EnvParam.DOCUMENT_TIMEOUT,
+            )
+
+            if text_content is None:
+                return None
+
+            return ExtractedContent(text=text_content)
+
+        except asyncio.TimeoutError:
+            logger.error(
+                "Timeout getting text from %s after %ds, restarting process pool",
+                metadata,
+                EnvParam.DOCUMENT_TIMEOUT,
             )
 
-            return text_content
+            shutdown_process_pool(pool=pool, is_kill=True)
+
+            return None
+
+        except BrokenProcessPool as e:
+            logger.error("Process pool broken getting text from %s %s", metadata, e)
+
+            shutdown_process_pool(pool=pool)
+
+            return None
 
         except Exception as e:
             logger.error("Error getting text from base64 %s", e)
 
             return None
 
+    async def pdf_to_txt(
+        self, pdf_bytes: bytes, metadata: str, pool: ProcessPoolExecutor
+    ) -> ExtractedContent:
+        """Convert pdf to text, the page ranges are extracted in parallel by the
+        process pool"""
+
+        loop = asyncio.get_running_loop()
+
+        nb_pages: int = await loop.run_in_executor(pool, count_pdf_pages, pdf_bytes)
+
+        fontsizes: Optional[dict[int, int]] = None
+
+        if is_pdf_markdown():
+            fontsizes = await self.get_pdf_fontsizes(
+                pdf_bytes=pdf_bytes, nb_pages=nb_pages, pool=pool
+            )
+
+        page_ranges: list[Tuple] = get_page_ranges(
+            nb_pages=nb_pages,
+            nb_workers=EnvParam.DOCUMENTS_NB_WORKERS,
+            min_pages=EnvParam.PDF_MIN_PAGES_BY_WORKER,
+        )
+
+        pages_by_range: list[list[str]] = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    pool, extract_pdf_pages, pdf_bytes, first_page, last_page, fontsizes
+                )
+                for first_page, last_page in page_ranges
+            ]
+        )
+
+        text, page_offsets = join_pages(
+            pages=[page for pages in pages_by_range for page in pages]
+        )
+
+        logger.info(
+            "PDF %s convert succesfully (%d pages, %d workers, %s)",
+            metadata,
+            nb_pages,
+            len(page_ranges),
+            EnvParam.PDF_EXTRACTION_MODE,
+        )
+
+        return ExtractedContent(text=text, page_offsets=page_offsets)
+
+    async def get_pdf_fontsizes(
+        self, pdf_bytes: bytes, nb_pages: int, pool: ProcessPoolExecutor
+    ) -> dict:
+        """Font sizes statistics giving the markdown headers, counted in parallel
+        on a sample of pages"""
+
+        loop = asyncio.get_running_loop()
+
+        pages: list[int] = sample_pages(nb_pages, EnvParam.PDF_HEADER_SAMPLE_PAGES)
+
+        page_ranges: list[Tuple] = get_page_ranges(
+            nb_pages=len(pages),
+            nb_workers=EnvParam.DOCUMENTS_NB_WORKERS,
+            min_pages=EnvParam.PDF_MIN_PAGES_BY_WORKER,
+        )
+
+        fontsizes_by_range: list[dict[int, int]] = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    pool,
+                    get_pdf_fontsizes,
+                    pdf_bytes,
+                    pages[first_index:last_index],
+                )
+                for first_index, last_index in page_ranges
+            ]
+        )
+
+        fontsizes: dict[int, int] = {}
+
+        for range_fontsizes in fontsizes_by_range:
+            for fontsize, nb_char in range_fontsizes.items():
+                fontsizes[fontsize] = fontsizes.get(fontsize, 0) + nb_char
+
+        return fontsizes
+
     def extract_content(
         self, decoded_data: bytes, extension: Optional[str]
     ) -> Optional[str]:
@@ -134,11 +428,20 @@ class Documents(BaseModel):
         """Convert pdf to text"""
 
         try:
-            text = ""
-
             with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-                for page in doc:
-                    text += page.get_text()
+                if is_pdf_markdown():
+                    text = to_markdown(
+                        doc,
+                        fontsizes=get_fontsizes(
+                            doc,
+                            pages=sample_pages(
+                                doc.page_count, EnvParam.PDF_HEADER_SAMPLE_PAGES
+                            ),
+                        ),
+                    )
+
+                else:
+                    text, _ = join_pages(pages=[page.get_text() for page in doc])
 
         except Exception as e:
             logger.error("Error converting base64 to pdf %s", e)
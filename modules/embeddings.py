@@ -3,7 +3,7 @@
 import os
 from typing import List, Tuple, Optional
 
-from langchain.evaluation import EmbeddingDistance, EvaluatorType, load_evaluator
+import numpy as np
 
 from langchain.schema import Document
 from langchain.vectorstores.faiss import FAISS
@@ -12,32 +12,51 @@ from langchain_community.vectorstores.utils import DistanceStrategy
 
 
 from modules import logger
-from modules.splitter import Splitter
-from modules.utils import token_count
+from modules.distance import DistanceEngine
+from modules.embeddings_cache import CachedEmbeddings
+from modules.faiss_store import FaissStore
+from modules.splitter import SPLITTER_VERSION, Splitter
 
 
 from config.config import EnvParam
 
 
-embeddings_handler: AzureOpenAIEmbeddings | OpenAIEmbeddings
+embeddings_model: AzureOpenAIEmbeddings | OpenAIEmbeddings
 
 if EnvParam.USE_AZURE:
-    embeddings_handler = AzureOpenAIEmbeddings(
+    embeddings_model = AzureOpenAIEmbeddings(
         azure_deployment=EnvParam.EMBEDDING_DEPLOYMENT,
         api_version=EnvParam.OPENAI_API_VERSION,
         timeout=EnvParam.TIMEOUT_EMBEDDINGS,
     )
 
+    embeddings_model_name: str = (
+        f"{EnvParam.EMBEDDING_MODEL_AZURE}/{EnvParam.EMBEDDING_DEPLOYMENT}"
+    )
+
 else:
-    embeddings_handler = OpenAIEmbeddings(model=EnvParam.EMBEDDINGS_MODEL_OPEN_AI)
+    embeddings_model = OpenAIEmbeddings(model=EnvParam.EMBEDDINGS_MODEL_OPEN_AI)
+
+    embeddings_model_name = EnvParam.EMBEDDINGS_MODEL_OPEN_AI
+
+distance_engine = DistanceEngine(is_float16=EnvParam.EMBEDDINGS_CACHE_FLOAT16)
+
+embeddings_handler = CachedEmbeddings(
+    embeddings=embeddings_model,
+    model_name=embeddings_model_name,
+    max_size=EnvParam.EMBEDDINGS_CACHE_SIZE,
+    distance_engine=distance_engine,
+    db_path=EnvParam.EMBEDDINGS_CACHE_DB_PATH,
+)
 
 splitter = Splitter(
-    counter=token_count,
     chunk_size=500,
     seprators=[
         "\n\n",
         "\n",
     ],
+    chunk_overlap=EnvParam.CHUNK_OVERLAP,
+    clean_slice_chars=EnvParam.CLEAN_SLICE_CHARS,
 )
 
 
@@ -45,6 +64,21 @@ DISTANCE_STRATEGIE = DistanceStrategy.COSINE
 
 IS_NORMALIZE_L2 = False
 
+faiss_store = FaissStore(
+    db_path=EnvParam.FAISS_DB_PATH,
+    model_name=embeddings_model_name,
+    max_size_mb=EnvParam.FAISS_DB_MAX_SIZE_MB,
+    max_age_hours=EnvParam.FAISS_DB_MAX_AGE_HOURS,
+    settings=[
+        SPLITTER_VERSION,
+        str(splitter.chunk_size),
+        str(splitter.chunk_overlap),
+        *splitter.separators,
+        EnvParam.SPACY_MODEL,
+        EnvParam.PDF_EXTRACTION_MODE,
+    ],
+)
+
 
 class Embeddings:
     """Class handling all the embeddings stuff"""
@@ -53,15 +87,13 @@ class Embeddings:
         """Function that calcule cosinus distance beetween two text"""
 
         try:
-            evaluator = load_evaluator(
-                evaluator=EvaluatorType.EMBEDDING_DISTANCE,
-                embeddings=embeddings_handler,
-                distance_metric=EmbeddingDistance.COSINE,
+            vector_1, vector_2 = await embeddings_handler.aembed_arrays(
+                texts=[text_1, text_2]
             )
 
-            score: float = (
-                await evaluator.aevaluate_strings(prediction=text_1, reference=text_2)
-            )["score"]
+            score: float = distance_engine.cosine_distance(
+                vector_1=vector_1, vector_2=vector_2
+            )
 
         except Exception as e:
             logger.error("Error calculating distance : %s", e)
@@ -73,12 +105,40 @@ class Embeddings:
     async def embedding_query(self, query: str) -> List[float]:
         """Convert query to vector"""
 
-        vector: List[float] = embeddings_handler.embed_query(text=query)
+        vector: List[float] = await embeddings_handler.aembed_query(text=query)
 
         logger.info("Vector for query %s : %s", query, str(vector))
 
         return vector
 
+    async def embedding_documents(self, texts: List[str]) -> List[List[float]]:
+        """Convert a batch of texts to vectors in one call"""
+
+        if len(texts) == 0:
+            return []
+
+        vectors: List[List[float]] = await embeddings_handler.aembed_documents(
+            texts=texts
+        )
+
+        logger.info("Vectors created for %d texts", len(vectors))
+
+        return vectors
+
+    async def embedding_vectors(self, texts: List[str]) -> List[np.ndarray]:
+        """Convert a batch of texts to arrays in one call, kept in the cache dtype"""
+
+        if len(texts) == 0:
+            return []
+
+        vectors: List[np.ndarray] = await embeddings_handler.aembed_arrays(
+            texts=texts
+        )
+
+        logger.info("Vectors created for %d texts", len(vectors))
+
+        return vectors
+
     async def create_db(self, chunks: list[Document]) -> Optional[FAISS]:
         """Create FAISS DB with the chunks"""
 
@@ -120,30 +180,71 @@ class Embeddings:
 
         return chunks
 
+    async def get_db(self, file: Document) -> Optional[FAISS]:
+        """Load the FAISS DB of one file from disk, or split and embed it"""
+
+        document_hash: Optional[str] = file.metadata.get("document_hash")
+
+        if document_hash:
+            db: Optional[FAISS] = faiss_store.load(
+                document_hash=document_hash,
+                embeddings=embeddings_handler,
+                distance_strategy=DISTANCE_STRATEGIE,
+                normalize_L2=IS_NORMALIZE_L2,
+                metadata={
+                    key: value
+                    for key, value in file.metadata.items()
+                    if key != "page_offsets"
+                },
+            )
+
+            if db:
+                return db
+
+        chunks: list[Document] = splitter.split(docs=[file])
+
+        logger.info("Nb chunks after spliting %d", len(chunks))
+
+        for chunk in chunks:
+            logger.info("Chunk len %d", chunk.metadata["nb_token"])
+
+        db = await self.create_db(chunks=chunks)
+
+        if db and document_hash:
+            faiss_store.save(document_hash=document_hash, db=db)
+
+        return db
+
     async def select_chunk_with_faiss(
         self, files: list[Document], list_queries: list[str]
     ) -> list[Tuple[Document, float]]:
         """Select chunk from files"""
 
-        chunks: list[Document] = splitter.split(docs=files)
+        dbs: list[FAISS] = []
 
-        logger.info("Nb files after spliting %d", len(chunks))
+        for file in files:
+            db: Optional[FAISS] = await self.get_db(file=file)
 
-        for chunk in chunks:
-            logger.info("Chunk len %d", token_count(chunk.page_content))
+            if db:
+                dbs.append(db)
 
-        db: Optional[FAISS] = await self.create_db(chunks=chunks)
+        if len(dbs) == 0:
+            return []
 
-        if db:
-            selected_chunks: list[Tuple[Document, float]] = []
+        selected_chunks: list[Tuple[Document, float]] = []
 
-            for query in list_queries:
-                selected_chunks += await self.get_chunks_from_db(query=query, db=db)
+        for query in list_queries:
+            query_chunks: list[Tuple[Document, float]] = []
 
-            selected_chunks_sorted: list[Tuple[Document, float]] = sorted(
-                selected_chunks, key=lambda x: x[1]
-            )
+            for db in dbs:
+                query_chunks += await self.get_chunks_from_db(query=query, db=db)
+
+            selected_chunks += sorted(query_chunks, key=lambda x: x[1], reverse=True)[
+                : EnvParam.NB_CHUNK_BY_QUERY
+            ]
 
-            return selected_chunks_sorted
+        selected_chunks_sorted: list[Tuple[Document, float]] = sorted(
+            selected_chunks, key=lambda x: x[1]
+        )
 
-        return []
+        return selected_chunks_sorted
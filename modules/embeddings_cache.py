@@ -0,0 +1,186 @@
+"""Content-addressed cache layered under the embeddings handler"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings as BaseEmbeddings
+
+from modules import logger
+from modules.cache import LruCache, SqliteCache, hash_key
+from modules.distance import DistanceEngine
+
+
+class CachedEmbeddings(BaseEmbeddings):
+    """Embeddings handler that only embeds texts never seen before"""
+
+    def __init__(
+        self,
+        embeddings: BaseEmbeddings,
+        model_name: str,
+        max_size: int,
+        distance_engine: DistanceEngine,
+        db_path: Optional[str] = None,
+    ) -> None:
+        self.embeddings: BaseEmbeddings = embeddings
+
+        self.model_name: str = model_name
+
+        self.distance_engine: DistanceEngine = distance_engine
+
+        self.memory_cache = LruCache(max_size=max_size)
+
+        self.disk_cache: Optional[SqliteCache] = None
+
+        if db_path:
+            try:
+                self.disk_cache = SqliteCache(db_path=db_path, table="embeddings")
+
+            except Exception as e:
+                logger.error("Error opening embeddings disk cache %s", e)
+
+    def get_key(self, text: str) -> str:
+        """Key of a text for the current model"""
+
+        return hash_key(self.model_name, text)
+
+    def get_cached(self, text: str) -> Optional[np.ndarray]:
+        """Get vector from the memory tier then from the disk tier"""
+
+        key: str = self.get_key(text=text)
+
+        vector: Optional[np.ndarray] = self.memory_cache.get(key)
+
+        if vector is not None or self.disk_cache is None:
+            return vector
+
+        raw_vector: Optional[bytes] = self.disk_cache.get(key)
+
+        if raw_vector is None:
+            return None
+
+        self.memory_cache.stats.disk_hits += 1
+
+        vector = self.distance_engine.to_storage(
+            np.frombuffer(raw_vector, dtype=np.float32)
+        )
+
+        self.memory_cache.set(key, vector)
+
+        return vector
+
+    def set_cached(self, text: str, vector: List[float]) -> np.ndarray:
+        """Store vector in all the tiers"""
+
+        key: str = self.get_key(text=text)
+
+        stored_vector: np.ndarray = self.distance_engine.to_storage(vector)
+
+        self.memory_cache.set(key, stored_vector)
+
+        if self.disk_cache:
+            try:
+                self.disk_cache.set(
+                    key, np.asarray(vector, dtype=np.float32).tobytes()
+                )
+
+            except Exception as e:
+                logger.error("Error writing embeddings disk cache %s", e)
+
+        return stored_vector
+
+    def get_vectors(
+        self, texts: List[str]
+    ) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+        """Cached vectors (None if missing) and unique texts not cached yet"""
+
+        vectors: List[Optional[np.ndarray]] = [
+            self.get_cached(text=text) for text in texts
+        ]
+
+        missing_texts: List[str] = list(
+            dict.fromkeys(
+                text for text, vector in zip(texts, vectors) if vector is None
+            )
+        )
+
+        return vectors, missing_texts
+
+    def add_vectors(
+        self,
+        texts: List[str],
+        vectors: List[Optional[np.ndarray]],
+        missing_texts: List[str],
+        new_vectors: List[List[float]],
+    ) -> List[np.ndarray]:
+        """Store the new vectors and fill the missing ones"""
+
+        vectors_by_text: Dict[str, np.ndarray] = {
+            text: self.set_cached(text=text, vector=vector)
+            for text, vector in zip(missing_texts, new_vectors)
+        }
+
+        return [
+            vector if vector is not None else vectors_by_text[text]
+            for text, vector in zip(texts, vectors)
+        ]
+
+    def embed_arrays(self, texts: List[str]) -> List[np.ndarray]:
+        """Vectors of texts as arrays, only missing ones are embedded"""
+
+        vectors, missing_texts = self.get_vectors(texts=texts)
+
+        if not missing_texts:
+            return vectors
+
+        new_vectors: List[List[float]] = self.embeddings.embed_documents(missing_texts)
+
+        return self.add_vectors(
+            texts=texts,
+            vectors=vectors,
+            missing_texts=missing_texts,
+            new_vectors=new_vectors,
+        )
+
+    async def aembed_arrays(self, texts: List[str]) -> List[np.ndarray]:
+        """Vectors of texts as arrays, only missing ones are embedded"""
+
+        vectors, missing_texts = self.get_vectors(texts=texts)
+
+        if not missing_texts:
+            return vectors
+
+        new_vectors: List[List[float]] = await self.embeddings.aembed_documents(
+            missing_texts
+        )
+
+        return self.add_vectors(
+            texts=texts,
+            vectors=vectors,
+            missing_texts=missing_texts,
+            new_vectors=new_vectors,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self.embed_arrays(texts=texts)]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in await self.aembed_arrays(texts=texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_arrays(texts=[text])[0].tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_arrays(texts=[text]))[0].tolist()
+
+    def stats(self) -> dict:
+        """Cache counters, used to size the cache"""
+
+        return {
+            "model": self.model_name,
+            "size": len(self.memory_cache),
+            "max_size": self.memory_cache.max_size,
+            "dtype": np.dtype(self.distance_engine.storage_dtype).name,
+            "is_disk_enabled": self.disk_cache is not None,
+            **self.memory_cache.stats.model_dump(),
+        }
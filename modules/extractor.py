@@ -14,3 +14,19 @@ class ExtractorQueries(BaseModel):
     """All the requests and questions"""
 
     queries: List[SubQuery]
+
+
+class ExtractorQueryPlan(BaseModel):
+    """The standalone query, its subqueries and its stepback queries"""
+
+    standalone_query: str = Field(
+        description="The user query, understandable without the conversation"
+    )
+
+    sub_queries: List[SubQuery] = Field(
+        description="3 subqueries covering the whole meaning of the standalone query"
+    )
+
+    stepback_queries: List[SubQuery] = Field(
+        description="3 more generic stepback queries of the standalone query"
+    )
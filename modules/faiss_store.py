@@ -0,0 +1,179 @@
+"""Module persisting the FAISS index of each uploaded document on local disk"""
+
+import os
+import time
+import pickle
+import shutil
+from typing import Optional
+
+import faiss
+
+from langchain_core.embeddings import Embeddings as BaseEmbeddings
+from langchain.vectorstores.faiss import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from modules import logger
+from modules.cache import hash_key
+
+
+INDEX_FILE_NAME = "index.faiss"
+
+DOCSTORE_FILE_NAME = "index.pkl"
+
+
+class FaissStore:
+    """Store of FAISS indexes keyed by document content hash and by the settings
+    the chunks were built with"""
+
+    def __init__(
+        self,
+        db_path: str,
+        model_name: str,
+        max_size_mb: int,
+        max_age_hours: int,
+        settings: Optional[list[str]] = None,
+    ) -> None:
+        self.db_path: str = db_path
+
+        self.model_name: str = model_name
+
+        self.settings: list[str] = settings or []
+
+        self.max_size: int = max_size_mb * 1024 * 1024
+
+        self.max_age: int = max_age_hours * 3600
+
+    def get_path(self, document_hash: str) -> str:
+        """Folder of the index of one document for the current embeddings model
+        and chunking settings"""
+
+        return os.path.join(
+            self.db_path, hash_key(self.model_name, *self.settings, document_hash)
+        )
+
+    def load(
+        self,
+        document_hash: str,
+        embeddings: BaseEmbeddings,
+        distance_strategy: DistanceStrategy,
+        normalize_L2: bool,
+        metadata: Optional[dict] = None,
+    ) -> Optional[FAISS]:
+        """Load the index of one document with mmap, None if not stored. The
+        metadata of this upload (file name...) replaces the stored one"""
+
+        path: str = self.get_path(document_hash=document_hash)
+
+        if not os.path.isdir(path):
+            return None
+
+        try:
+            index_path: str = os.path.join(path, INDEX_FILE_NAME)
+
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+
+            except RuntimeError:
+                index = faiss.read_index(index_path)
+
+            with open(os.path.join(path, DOCSTORE_FILE_NAME), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+
+            if metadata:
+                for docstore_id in index_to_docstore_id.values():
+                    docstore.search(docstore_id).metadata.update(metadata)
+
+            os.utime(path)
+
+            logger.info("FAISS index loaded from disk for %s", document_hash)
+
+            return FAISS(
+                embedding_function=embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=index_to_docstore_id,
+                distance_strategy=distance_strategy,
+                normalize_L2=normalize_L2,
+            )
+
+        except Exception as e:
+            logger.error("Error loading FAISS index %s => %s", document_hash, e)
+
+            shutil.rmtree(path, ignore_errors=True)
+
+            return None
+
+    def save(self, document_hash: str, db: FAISS) -> None:
+        """Save the index of one document then keep the store bounded"""
+
+        path: str = self.get_path(document_hash=document_hash)
+
+        tmp_path: str = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            db.save_local(folder_path=tmp_path)
+
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+            os.replace(tmp_path, path)
+
+            logger.info("FAISS index saved on disk for %s", document_hash)
+
+        except Exception as e:
+            logger.error("Error saving FAISS index %s => %s", document_hash, e)
+
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self.evict()
+
+    def get_size(self, path: str) -> int:
+        """Size of one stored index"""
+
+        return sum(
+            os.path.getsize(os.path.join(path, file_name))
+            for file_name in os.listdir(path)
+        )
+
+    def evict(self) -> None:
+        """Remove indexes too old, then the least recently used ones above max size"""
+
+        if not os.path.isdir(self.db_path):
+            return
+
+        now: float = time.time()
+
+        entries: list[tuple[float, int, str]] = []
+
+        for name in os.listdir(self.db_path):
+            path: str = os.path.join(self.db_path, name)
+
+            if not os.path.isdir(path) or name.endswith(".tmp"):
+                continue
+
+            try:
+                last_used: float = os.path.getmtime(path)
+
+                if now - last_used > self.max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+
+                    logger.info("FAISS index %s evicted (age)", name)
+
+                    continue
+
+                entries.append((last_used, self.get_size(path=path), path))
+
+            except OSError as e:
+                logger.error("Error reading FAISS index %s => %s", name, e)
+
+        total_size: int = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            shutil.rmtree(path, ignore_errors=True)
+
+            total_size -= size
+
+            logger.info("FAISS index %s evicted (size)", os.path.basename(path))
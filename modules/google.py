@@ -1,18 +1,16 @@
 """_summary_"""
 
-import json
 import asyncio
 
 from typing import Tuple
 
-import httpx
-
 from pydantic import BaseModel
 
 from langchain.docstore.document import Document
 
 
 from modules import logger
+from modules.serper_client import serper_client
 
 
 from config.config import EnvParam
@@ -98,19 +96,14 @@ class Google(BaseModel):
 
         pages: list[Tuple[Document, float]] = []
 
-        payload = json.dumps({"q": query, "gl": "fr", "hl": "fr"})
-
-        headers = {
-            "X-API-KEY": EnvParam.GOOGLE_SERPER_API,
-            "Content-Type": "application/json",
-        }
-
-        async with httpx.AsyncClient() as client:
-            responses_search = (
-                await client.post(
-                    EnvParam.SERPER_URL_SEARCH, headers=headers, data=payload
-                )
-            ).json()
+        responses_search, responses_place_json = await asyncio.gather(
+            serper_client.search(
+                url=EnvParam.SERPER_URL_SEARCH, query=query, gl="fr", hl="fr"
+            ),
+            serper_client.search(
+                url=EnvParam.SERPER_URL_PLACES, query=query, gl="fr", hl="fr"
+            ),
+        )
 
         keys_to_keep = ["knowledgeGraph", "answerBox", "organic"]
 
@@ -190,21 +183,14 @@ class Google(BaseModel):
         except KeyError as e:
             logger.warning("There is no organic in Serper response %s", e)
 
-        async with httpx.AsyncClient() as client:
-            responses_place = (
-                await client.post(
-                    EnvParam.SERPER_URL_PLACES, headers=headers, data=payload
-                )
-            ).json()["places"]
-
-            responses_place = self.json_place_to_str(dict=responses_place)
+        responses_place = self.json_place_to_str(dict=responses_place_json["places"])
 
-            doc_place = Document(
-                page_content=f"{query}: {responses_place}",
-                metadata={"file_name": "link"},
-            )
+        doc_place = Document(
+            page_content=f"{query}: {responses_place}",
+            metadata={"file_name": "link"},
+        )
 
-            pages.append((doc_place, 1.0))
+        pages.append((doc_place, 1.0))
 
         return pages
 
@@ -68,6 +68,8 @@ class InputParams(BaseModel):
 
     documents: Optional[List[Dict[str, str]]] = None
 
+    stream: bool = False
+
 
 class InputParamsChat(BaseModel):
     """Input user params"""
@@ -88,6 +90,8 @@ class InputParamsChat(BaseModel):
 
     documents: Optional[List[Dict[str, str]]] = None
 
+    stream: bool = False
+
 
 class InputParamsWeb(BaseModel):
     """Input user params for web route"""
@@ -108,6 +112,8 @@ class InputParamsWeb(BaseModel):
 
     documents: Optional[List[Dict[str, str]]] = None
 
+    stream: bool = False
+
 
 class InputParamsEmail(BaseModel):
     """Input user params"""
@@ -128,6 +134,8 @@ class InputParamsEmail(BaseModel):
 
     documents: Optional[List[Dict[str, str]]] = None
 
+    stream: bool = False
+
 
 class InputParamsGLPI(BaseModel):
     """Input user params"""
@@ -147,3 +155,5 @@ class InputParamsGLPI(BaseModel):
     chat_history: List[Dict[str, str]]
 
     documents: Optional[List[Dict[str, str]]] = None
+
+    stream: bool = False
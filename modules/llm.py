@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
-from typing import Type, Optional, TypeVar
+import json
+from typing import Type, Optional, TypeVar, AsyncIterator
 
 from pydantic import BaseModel, Field
 from langchain.chains.llm import LLMChain
 from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers.openai_functions import JsonKeyOutputFunctionsParser
+from langchain.output_parsers.openai_functions import (
+    JsonKeyOutputFunctionsParser,
+    JsonOutputFunctionsParser,
+)
 from langchain.schema.messages import (
     HumanMessage,
     AIMessage,
@@ -24,13 +28,18 @@ from langchain_community.callbacks.manager import get_openai_callback
 
 from config.config import EnvParam
 
-from modules import logger, token_counter
+from modules import logger
+from modules.request_context import get_request_context
+from modules.llm_clients import llm_client_registry, OPENAI_ENDPOINT
+from modules.completion_cache import completion_cache
+from modules.token_budget import token_count
 
 from modules.prompt import (
     semantic_review_system_prompt,
     standalone_system_prompt,
     multiquery_system_prompt,
     abstract_system_prompt,
+    query_plan_system_prompt,
     raw_answer_system_prompt,
     raw_answer_system_prompt_with_context,
     source_system_prompt,
@@ -64,51 +73,67 @@ class Llm(BaseModel):
 
     @property
     def llm(self) -> AzureChatOpenAI | ChatOpenAI:
-        """ChatOpenAI getter"""
+        """ChatOpenAI getter, clients are pooled in the registry"""
+
+        request_context = get_request_context()
 
         if self.is_temperature_changeable:
-            self.llm_temperature = EnvParam.USER_TEMPERATURE
+            temperature: float = request_context.temperature
+
+        else:
+            temperature = self.llm_temperature
 
         if EnvParam.USE_AZURE:
-            if EnvParam.USE_GPT_4 and self.is_use_gpt_4:
-                self.llm_model = "GPT_4"
+            if request_context.is_use_gpt_4 and self.is_use_gpt_4:
+                model: str = "GPT_4"
 
-                api_key: str = EnvParam.AZURE_OPENAI_API_KEY_GPT_4
+                api_key: Optional[str] = EnvParam.AZURE_OPENAI_API_KEY_GPT_4
 
-                azure_endpoint: str = EnvParam.AZURE_OPENAI_ENDPOINT_GPT_4
+                endpoint: str = EnvParam.AZURE_OPENAI_ENDPOINT_GPT_4
 
-                azure_deployment: str = EnvParam.AZURE_GPT_MODEL_DEPLOYMENT_GPT_4
+                deployment: str = EnvParam.AZURE_GPT_MODEL_DEPLOYMENT_GPT_4
 
-                self.llm_timeout = self.llm_timeout + 50
+                timeout: int = self.llm_timeout + 50
             else:
-                self.llm_model = "GPT_3.5"
+                model = "GPT_3.5"
 
                 api_key = EnvParam.AZURE_OPENAI_API_KEY
 
-                azure_endpoint = EnvParam.AZURE_OPENAI_ENDPOINT
+                endpoint = EnvParam.AZURE_OPENAI_ENDPOINT
 
-                azure_deployment = EnvParam.AZURE_GPT_MODEL_DEPLOYMENT
+                deployment = EnvParam.AZURE_GPT_MODEL_DEPLOYMENT
 
-            api_version: str = EnvParam.OPENAI_API_VERSION
+                timeout = self.llm_timeout
 
-            return AzureChatOpenAI(
-                azure_deployment=azure_deployment,
-                api_key=api_key,
-                azure_endpoint=azure_endpoint,
-                api_version=api_version,
-                model=self.llm_model,
-                timeout=self.llm_timeout,
-                max_retries=self.llm_retries,
-                temperature=self.llm_temperature,
-            )
+        else:
+            model = self.llm_model
 
-        return ChatOpenAI(
-            model=self.llm_model,
-            timeout=self.llm_timeout,
+            api_key = None
+
+            endpoint = OPENAI_ENDPOINT
+
+            deployment = self.llm_model
+
+            timeout = self.llm_timeout
+
+        return llm_client_registry.get(
+            endpoint=endpoint,
+            deployment=deployment,
+            temperature=temperature,
+            timeout=timeout,
+            model=model,
             max_retries=self.llm_retries,
-            temperature=self.llm_temperature,
+            api_key=api_key,
         )
 
+    def get_system_prompt(self, **params_prompt: str) -> Optional[SystemMessage]:
+        """system_prompt getter, filled with the params of the current request"""
+
+        if isinstance(self.system_prompt_str, str):
+            return SystemMessage(content=self.system_prompt_str.format(**params_prompt))
+
+        return self.system_prompt
+
     @property
     def system_prompt(self) -> Optional[SystemMessage]:
         """system_prompt getter"""
@@ -122,18 +147,62 @@ class Llm(BaseModel):
         else:
             return None
 
+    def get_cache_key(
+        self,
+        llm: AzureChatOpenAI | ChatOpenAI,
+        messages: list[BaseMessage],
+        output_format: str = "text",
+    ) -> Optional[str]:
+        """Completion cache key, None if the user can change the temperature"""
+
+        if self.is_temperature_changeable:
+            return None
+
+        return completion_cache.get_key(
+            messages=messages,
+            model=f"{llm.model_name}/{getattr(llm, 'deployment_name', '')}",
+            temperature=llm.temperature,
+            output_format=output_format,
+        )
+
+    def get_cached_completion(self, cache_key: Optional[str]) -> Optional[dict]:
+        """Cached completion, the tokens it cost are counted as saved"""
+
+        if not cache_key:
+            return None
+
+        entry: Optional[dict] = completion_cache.get(key=cache_key)
+
+        if entry:
+            get_request_context().token_counter.saved_token += entry["nb_token"]
+
+        return entry
+
     async def inference(
         self, prompt: ChatPromptTemplate, params_prompt: dict = {}
     ) -> str:
         """Function that running Llm"""
 
-        chain = LLMChain(llm=self.llm, prompt=prompt)
+        llm = self.llm
+
+        cache_key: Optional[str] = self.get_cache_key(
+            llm=llm, messages=prompt.format_messages(**params_prompt)
+        )
+
+        cached_completion: Optional[dict] = self.get_cached_completion(
+            cache_key=cache_key
+        )
+
+        if cached_completion:
+            return cached_completion["result"]
+
+        chain = LLMChain(llm=llm, prompt=prompt)
 
         logger.info(
-            "Using Llm %s with temperature %f and timeout %d",
-            str(self.llm_model),
-            self.llm_temperature,
-            self.llm_timeout,
+            "Using Llm %s with temperature %f and timeout %s",
+            str(llm.model_name),
+            llm.temperature,
+            str(llm.request_timeout),
         )
 
         with get_openai_callback() as cb:
@@ -141,10 +210,52 @@ class Llm(BaseModel):
 
             logger.info("Token used => %d", cb.completion_tokens + cb.prompt_tokens)
 
-            token_counter.token += cb.completion_tokens + cb.prompt_tokens
+            get_request_context().token_counter.token += (
+                cb.completion_tokens + cb.prompt_tokens
+            )
+
+        if cache_key:
+            completion_cache.set(
+                key=cache_key,
+                result=result,
+                nb_token=cb.completion_tokens + cb.prompt_tokens,
+            )
 
         return result
 
+    async def inference_stream(
+        self, prompt: ChatPromptTemplate, params_prompt: dict = {}
+    ) -> AsyncIterator[str]:
+        """Function that running Llm and yield the answer tokens as they arrive"""
+
+        llm = self.llm
+
+        chain = prompt | llm
+
+        logger.info(
+            "Streaming Llm %s with temperature %f and timeout %s",
+            str(llm.model_name),
+            llm.temperature,
+            str(llm.request_timeout),
+        )
+
+        result: str = ""
+
+        async for chunk in chain.astream(params_prompt):
+            token: str = str(chunk.content)
+
+            result += token
+
+            yield token
+
+        nb_token: int = token_count(
+            text=prompt.format(**params_prompt)
+        ) + token_count(text=result)
+
+        logger.info("Token used => %d", nb_token)
+
+        get_request_context().token_counter.token += nb_token
+
     async def inference_multi_extractor(
         self, prompt: ChatPromptTemplate, object: Type[T_base_model], object_name: str
     ) -> list[str]:
@@ -190,18 +301,45 @@ class Llm(BaseModel):
 
             parser = JsonKeyOutputFunctionsParser(key_name=object_name)
 
-            chain_multi_extractor = (
-                raw_result_chat_prompt
-                | self.llm.bind(functions=openai_functions)
-                | parser
+            llm = self.llm
+
+            cache_key: Optional[str] = self.get_cache_key(
+                llm=llm,
+                messages=raw_result_prompt,
+                output_format=f"{object_name}:{json.dumps(openai_functions)}",
             )
 
-            with get_openai_callback() as cb:
-                result_str = await chain_multi_extractor.ainvoke({})
+            cached_completion: Optional[dict] = self.get_cached_completion(
+                cache_key=cache_key
+            )
 
-                logger.info("Token used => %d", cb.completion_tokens + cb.prompt_tokens)
+            if cached_completion:
+                result_str = cached_completion["result"]
 
-                token_counter.token += cb.completion_tokens + cb.prompt_tokens
+            else:
+                chain_multi_extractor = (
+                    raw_result_chat_prompt
+                    | llm.bind(functions=openai_functions)
+                    | parser
+                )
+
+                with get_openai_callback() as cb:
+                    result_str = await chain_multi_extractor.ainvoke({})
+
+                    logger.info(
+                        "Token used => %d", cb.completion_tokens + cb.prompt_tokens
+                    )
+
+                    get_request_context().token_counter.token += (
+                        cb.completion_tokens + cb.prompt_tokens
+                    )
+
+                if cache_key:
+                    completion_cache.set(
+                        key=cache_key,
+                        result=result_str,
+                        nb_token=cb.completion_tokens + cb.prompt_tokens,
+                    )
 
             result_list: list[str] = [
                 str(query["query"]).strip().replace("\n", " ") for query in result_str
@@ -209,6 +347,63 @@ class Llm(BaseModel):
 
         return result_list
 
+    async def inference_extractor(
+        self, prompt: ChatPromptTemplate, object: Type[T_base_model]
+    ) -> T_base_model:
+        """Function that running Llm with a forced function call in given format"""
+
+        llm = self.llm
+
+        openai_function: dict = convert_pydantic_to_openai_function(object)
+
+        cache_key: Optional[str] = self.get_cache_key(
+            llm=llm,
+            messages=prompt.format_messages(),
+            output_format=json.dumps(openai_function),
+        )
+
+        cached_completion: Optional[dict] = self.get_cached_completion(
+            cache_key=cache_key
+        )
+
+        if cached_completion:
+            return object.model_validate(cached_completion["result"])
+
+        chain_extractor = (
+            prompt
+            | llm.bind(
+                functions=[openai_function],
+                function_call={"name": openai_function["name"]},
+            )
+            | JsonOutputFunctionsParser()
+        )
+
+        logger.info(
+            "Using Llm %s with function %s",
+            str(llm.model_name),
+            openai_function["name"],
+        )
+
+        with get_openai_callback() as cb:
+            result: dict = await chain_extractor.ainvoke({})
+
+            logger.info("Token used => %d", cb.completion_tokens + cb.prompt_tokens)
+
+            get_request_context().token_counter.token += (
+                cb.completion_tokens + cb.prompt_tokens
+            )
+
+        extracted: T_base_model = object.model_validate(result)
+
+        if cache_key:
+            completion_cache.set(
+                key=cache_key,
+                result=result,
+                nb_token=cb.completion_tokens + cb.prompt_tokens,
+            )
+
+        return extracted
+
 
 def create_chat_prompt(
     system_prompt: Optional[SystemMessage],
@@ -324,6 +519,15 @@ llm_abstract_query = Llm(
     system_prompt_str=abstract_system_prompt,
 )
 
+llm_query_plan = Llm(
+    is_use_gpt_4=False,
+    is_temperature_changeable=False,
+    llm_temperature=EnvParam.TEMPERATURE,
+    llm_timeout=EnvParam.TIMEOUT,
+    llm_retries=EnvParam.NB_RETRY,
+    system_prompt_str=query_plan_system_prompt,
+)
+
 llm_google_query = Llm(
     is_use_gpt_4=False,
     is_temperature_changeable=False,
@@ -0,0 +1,206 @@
+"""Registry of long-lived Llm clients sharing keep-alive HTTP connection pools"""
+
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from pydantic import BaseModel
+
+from langchain_openai import AzureChatOpenAI, ChatOpenAI
+
+from config.config import EnvParam
+
+from modules import logger
+
+
+OPENAI_ENDPOINT = "https://api.openai.com/v1"
+
+
+class HttpPoolStats(BaseModel):
+    """Usage counters of one HTTP connection pool"""
+
+    requests: int = 0
+
+    errors: int = 0
+
+    in_flight: int = 0
+
+    max_in_flight: int = 0
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """HTTP transport counting the requests going through the pool"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, stats: HttpPoolStats):
+        self.transport: httpx.AsyncBaseTransport = transport
+
+        self.stats: HttpPoolStats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.requests += 1
+
+        self.stats.in_flight += 1
+
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+
+        try:
+            return await self.transport.handle_async_request(request)
+
+        except Exception:
+            self.stats.errors += 1
+
+            raise
+
+        finally:
+            self.stats.in_flight -= 1
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class LlmClientRegistry:
+    """Llm clients keyed by (endpoint, deployment, temperature, timeout)"""
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+        self.http_clients: Dict[str, httpx.AsyncClient] = {}
+
+        self.pools_stats: Dict[str, HttpPoolStats] = {}
+
+        self.llm_clients: Dict[
+            Tuple[str, str, float, int], AzureChatOpenAI | ChatOpenAI
+        ] = {}
+
+    def get_endpoints(self) -> list[str]:
+        """Endpoints used by the app"""
+
+        if EnvParam.USE_AZURE:
+            return list(
+                dict.fromkeys(
+                    [
+                        EnvParam.AZURE_OPENAI_ENDPOINT,
+                        EnvParam.AZURE_OPENAI_ENDPOINT_GPT_4,
+                    ]
+                )
+            )
+
+        return [OPENAI_ENDPOINT]
+
+    def start(self) -> None:
+        """Open the connection pools of all the endpoints (app startup)"""
+
+        for endpoint in self.get_endpoints():
+            self.get_http_client(endpoint=endpoint)
+
+        logger.info("Llm connection pools opened for %d endpoints", len(self.http_clients))
+
+    def get_http_client(self, endpoint: str) -> httpx.AsyncClient:
+        """Connection pool of one endpoint, opened if missing"""
+
+        http_client: Optional[httpx.AsyncClient] = self.http_clients.get(endpoint)
+
+        if http_client is None or http_client.is_closed:
+            stats = self.pools_stats.setdefault(endpoint, HttpPoolStats())
+
+            http_client = httpx.AsyncClient(
+                transport=CountingTransport(
+                    transport=httpx.AsyncHTTPTransport(limits=self.limits),
+                    stats=stats,
+                ),
+                limits=self.limits,
+            )
+
+            self.http_clients[endpoint] = http_client
+
+        return http_client
+
+    def get(
+        self,
+        endpoint: str,
+        deployment: str,
+        temperature: float,
+        timeout: int,
+        model: str,
+        max_retries: int,
+        api_key: Optional[str] = None,
+    ) -> AzureChatOpenAI | ChatOpenAI:
+        """Get the Llm client for these settings, created once and reused"""
+
+        key: Tuple[str, str, float, int] = (endpoint, deployment, temperature, timeout)
+
+        http_client: httpx.AsyncClient = self.get_http_client(endpoint=endpoint)
+
+        llm_client: Optional[AzureChatOpenAI | ChatOpenAI] = self.llm_clients.get(key)
+
+        if llm_client is not None and llm_client.http_async_client is http_client:
+            return llm_client
+
+        if EnvParam.USE_AZURE:
+            llm_client = AzureChatOpenAI(
+                azure_deployment=deployment,
+                api_key=api_key,
+                azure_endpoint=endpoint,
+                api_version=EnvParam.OPENAI_API_VERSION,
+                model=model,
+                timeout=timeout,
+                max_retries=max_retries,
+                temperature=temperature,
+                http_async_client=http_client,
+            )
+
+        else:
+            llm_client = ChatOpenAI(
+                model=model,
+                timeout=timeout,
+                max_retries=max_retries,
+                temperature=temperature,
+                http_async_client=http_client,
+            )
+
+        self.llm_clients[key] = llm_client
+
+        logger.info("Llm client created for %s", str(key))
+
+        return llm_client
+
+    async def aclose(self) -> None:
+        """Close all the connection pools (app shutdown)"""
+
+        for http_client in self.http_clients.values():
+            await http_client.aclose()
+
+        self.http_clients = {}
+
+        self.llm_clients = {}
+
+        logger.info("Llm connection pools closed")
+
+    def stats(self) -> dict:
+        """Pools usage, used to size them"""
+
+        return {
+            "nb_clients": len(self.llm_clients),
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "pools": {
+                endpoint: stats.model_dump()
+                for endpoint, stats in self.pools_stats.items()
+            },
+        }
+
+
+llm_client_registry = LlmClientRegistry(
+    max_connections=EnvParam.LLM_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=EnvParam.LLM_POOL_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=EnvParam.LLM_POOL_KEEPALIVE_EXPIRY,
+)
@@ -63,6 +63,18 @@ stepback query 1:
 stepback query 2:
 stepback query 3:"""
 
+# Query plan ##############
+
+query_plan_system_prompt = """You are an expert at world knowledge that prepares the searches needed to answer the user's query in one go.
+You have acces to these documents:
+{documents}
+
+First, contextualize the user's query based on the history of the conversation so that it is understandable without the rest of the discussion. If there is no history, keep the query as it is.
+Then, split this standalone query into 3 subqueries to cover the all meaning of the query.
+Finally, step back and paraphrase the standalone query to 3 more generic step-back queries, which are easier to answer. Use a different vocabulary for each query, while keeping syntax simple."""
+
+query_plan_instruction = """Create the standalone query, the 3 subqueries and the 3 stepback queries of my query."""
+
 # Google Query ############
 
 google_query_system_prompt = """You are an expert at world knowledge. Your task is to create a relevant google query based on the user's request. Add clear time information where possible.
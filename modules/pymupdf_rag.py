@@ -44,41 +44,68 @@ if fitz.pymupdf_version_tuple < (1, 24, 0):
     raise NotImplementedError("PyMuPDF version 1.24.0 or later is needed.")
 
 
-def to_markdown(doc: fitz.Document, pages: list = None) -> str:
-    """Process the document and return the text of its selected pages."""
+def get_fontsizes(doc: fitz.Document, pages: list = None) -> dict:
+    """Count the characters of each rounded font size on the selected pages."""
     SPACES = set(string.whitespace)  # used to check relevance of text pieces
+    if pages is None:  # use all pages if omitted
+        pages = range(doc.page_count)
+    fontsizes = {}
+    for pno in pages:
+        page = doc[pno]
+        blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]
+        for span in [  # look at all non-empty horizontal spans
+            s
+            for b in blocks
+            for l in b["lines"]
+            for s in l["spans"]
+            if not SPACES.issuperset(s["text"])
+        ]:
+            fontsz = round(span["size"])
+            count = fontsizes.get(fontsz, 0) + len(span["text"].strip())
+            fontsizes[fontsz] = count
+    return fontsizes
+
+
+def sample_pages(page_count: int, sample_size: int) -> list:
+    """Return evenly spread page numbers, enough for the fontsizes statistics."""
+    if page_count <= sample_size:
+        return list(range(page_count))
+    return sorted({i * page_count // sample_size for i in range(sample_size)})
+
+
+def to_markdown(doc: fitz.Document, pages: list = None, fontsizes: dict = None) -> str:
+    """Process the document and return the text of its selected pages.
+
+    The header font sizes are computed from all the selected pages, unless
+    fontsizes (as returned by get_fontsizes) is given.
+    """
     if not pages:  # use all pages if argument not given
         pages = range(doc.page_count)
 
     class IdentifyHeaders:
         """Compute data for identifying header text."""
 
-        def __init__(self, doc, pages: list = None, body_limit: float = None):
+        def __init__(
+            self,
+            doc,
+            pages: list = None,
+            body_limit: float = None,
+            fontsizes: dict = None,
+        ):
             """Read all text and make a dictionary of fontsizes.
 
             Args:
                 pages: optional list of pages to consider
                 body_limit: consider text with larger font size as some header
+                fontsizes: optional fontsizes already counted, e.g. on a sample
             """
-            if pages is None:  # use all pages if omitted
-                pages = range(doc.page_count)
-            fontsizes = {}
-            for pno in pages:
-                page = doc[pno]
-                blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]
-                for span in [  # look at all non-empty horizontal spans
-                    s
-                    for b in blocks
-                    for l in b["lines"]
-                    for s in l["spans"]
-                    if not SPACES.issuperset(s["text"])
-                ]:
-                    fontsz = round(span["size"])
-                    count = fontsizes.get(fontsz, 0) + len(span["text"].strip())
-                    fontsizes[fontsz] = count
+            if fontsizes is None:  # count them on the pages if not provided
+                fontsizes = get_fontsizes(doc, pages=pages)
 
             # maps a fontsize to a string of multiple # header tag characters
             self.header_id = {}
+            if not fontsizes:  # no text: no header
+                return
             if body_limit is None:  # body text fontsize if not provided
                 body_limit = sorted(
                     [(k, v) for k, v in fontsizes.items()],
@@ -233,8 +260,8 @@ def to_markdown(doc: fitz.Document, pages: list = None) -> str:
             code = False
         return out_string.replace(" \n", "\n")
 
-    hdr_prefix = IdentifyHeaders(doc, pages=pages)
-    md_string = ""
+    hdr_prefix = IdentifyHeaders(doc, pages=pages, fontsizes=fontsizes)
+    md_parts = []  # joined once at the end
 
     for pno in pages:
         page = doc[pno]
@@ -294,14 +321,14 @@ def to_markdown(doc: fitz.Document, pages: list = None) -> str:
         # we have all rectangles and can start outputting their contents
         for rtype, r, idx in text_rects:
             if rtype == "text":  # a text rectangle
-                md_string += write_text(page, r, hdr_prefix)  # write MD content
-                md_string += "\n"
+                md_parts.append(write_text(page, r, hdr_prefix))  # write MD content
+                md_parts.append("\n")
             else:  # a table rect
-                md_string += tabs[idx].to_markdown(clean=False)
+                md_parts.append(tabs[idx].to_markdown(clean=False))
 
-        md_string += "\n-----\n\n"
+        md_parts.append("\n-----\n\n")
 
-    return md_string
+    return "".join(md_parts)
 
 
 if __name__ == "__main__":
@@ -2,17 +2,19 @@
 
 import os
 import time
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, Any, AsyncIterator
 
 from datetime import datetime
 
+import numpy as np
+
 from pydantic import ValidationError
 
 from azure.monitor.events.extension import track_event
 
 from config.config import EnvParam
 
-from modules import logger, token_counter
+from modules import logger
 
 from modules.chain import Chain
 from modules.documents import Documents
@@ -30,8 +32,30 @@ from modules.input_params import (
     InputParamsWeb,
     InputParamsEmail,
     InputParamsGLPI,
+    SearchType,
 )
 from modules.queries import get_follow_up_questions
+from modules.utils import sse_event
+from modules.scheduler import DagScheduler
+from modules.request_context import RequestContext, set_request_context
+from modules.answer_cache import answer_cache
+
+
+STREAMED_STAGES = {
+    "answer_formated",
+    "answer_markdown",
+    "references",
+    "suggestedQuestions",
+    "response",
+}
+
+# Only the sharepoint index has a catalog bumping its version when documents
+# change, the email and glpi answers are only expired by ANSWER_CACHE_TTL_SECONDS
+ANSWER_CACHE_INDEX_NAMES = {
+    Deployement.SHAREPOINT: EnvParam.AZURE_AI_SEARCH_INDEX_NAME_SHAREPOINT,
+    Deployement.EMAIL: EnvParam.AZURE_AI_SEARCH_INDEX_NAME_MAIL,
+    Deployement.GLPI: EnvParam.AZURE_AI_SEARCH_INDEX_NAME_GLPI,
+}
 
 
 class QA:
@@ -47,8 +71,6 @@ class QA:
             | InputParamsGLPI
         ),
     ) -> None:
-        token_counter.token = 0
-
         self.input_params: (
             InputParams | InputParamsChat | InputParamsWeb | InputParamsGLPI
         ) = input_params
@@ -91,6 +113,12 @@ class QA:
         else:
             raise ValidationError
 
+        self.request_context: RequestContext = self.create_request_context()
+
+        self.answer_cache_scope: Optional[str] = self.get_answer_cache_scope()
+
+        self.question_vector: Optional[np.ndarray] = None
+
         self.chain = Chain(
             input_params=self.input_params,
             chunk_retreiver=chunk_retreiver,
@@ -98,32 +126,121 @@ class QA:
             memory_list=self.memory_list,
         )
 
-    def input_param_to_env(self):
-        """Setup param from json to env"""
-
-        if self.input_params.gpt_model == GptModel.GPT_4_0:
-            EnvParam.USE_GPT_4 = True
+    def create_request_context(self) -> RequestContext:
+        """Setup request params from json, scoped to this request only"""
 
-        EnvParam.USER_TEMPERATURE = self.input_params.temperature
+        request_context = RequestContext(
+            deployement=self.input_params.deployement,
+            is_use_gpt_4=EnvParam.USE_GPT_4
+            or self.input_params.gpt_model == GptModel.GPT_4_0,
+            temperature=self.input_params.temperature,
+        )
 
         if self.input_params.deployement in {
             Deployement.DOCUMENT,
             Deployement.SHAREPOINT,
         }:
-            EnvParam.NB_FILES_FOR_CHUNKS = self.input_params.number_of_documents
+            request_context.nb_files_for_chunks = self.input_params.number_of_documents
 
         if self.input_params.deployement in {Deployement.WEB}:
-            EnvParam.NB_CHUNK_FOR_CONTEXT = 100
+            request_context.nb_chunk_for_context = 100
+
+        return request_context
+
+    def get_answer_cache_scope(self) -> Optional[str]:
+        """Partition of the answer cache for this request, None if not cacheable"""
+
+        if (
+            self.input_params.deployement.value not in EnvParam.ANSWER_CACHE_DEPLOYMENTS
+            or self.input_params.deployement not in ANSWER_CACHE_INDEX_NAMES
+            or self.memory_list
+            or self.input_params.documents
+        ):
+            return None
+
+        return answer_cache.get_scope(
+            self.input_params.deployement.value,
+            ANSWER_CACHE_INDEX_NAMES[self.input_params.deployement],
+            self.input_params.gpt_model.value,
+            repr(float(self.input_params.temperature)),
+            self.get_search_type() or "",
+            str(getattr(self.input_params, "number_of_documents", "")),
+        )
 
-    async def run(self) -> Dict:
-        """Function that create raw answser from user input and context, then add format and sources"""
+    def get_search_type(self) -> Optional[str]:
+        """Search type of the request, None if its route has none"""
 
-        start_time = time.time()
+        search_type: Optional[SearchType] = getattr(
+            self.input_params, "search_type", None
+        )
+
+        return search_type.value if search_type else None
+
+    async def get_cached_results(self) -> Optional[Dict[str, Any]]:
+        """Results of a similar question already answered, rewritten for this user"""
+
+        if not self.answer_cache_scope:
+            return None
+
+        try:
+            self.question_vector = await answer_cache.embed_question(
+                question=self.user_input
+            )
+
+            results: Optional[Dict[str, Any]] = answer_cache.get(
+                scope=self.answer_cache_scope, vector=self.question_vector
+            )
+
+        except Exception as e:
+            logger.error("Error reading answer cache %s", e)
+
+            return None
 
-        self.input_param_to_env()
+        if not results:
+            return None
+
+        results["response"].update(
+            {
+                "temperature": self.input_params.temperature,
+                "userid": self.input_params.userid,
+                "useremail": self.input_params.useremail,
+                "chat_history": [
+                    {"question": self.user_input, "answer": results["answer"]}
+                ],
+            }
+        )
+
+        if "search_type" in results["response"]:
+            results["response"]["search_type"] = self.get_search_type()
+
+        return results
+
+    def set_cached_results(self, results: Dict[str, Any]) -> None:
+        """Store the results of this request for the next similar questions"""
+
+        if (
+            not self.answer_cache_scope
+            or self.question_vector is None
+            or EnvParam.ERROR_MESSAGE in results.get("answer", "")
+            or "response" not in results
+        ):
+            return
+
+        answer_cache.set(
+            scope=self.answer_cache_scope,
+            index_name=ANSWER_CACHE_INDEX_NAMES[self.input_params.deployement],
+            question=self.user_input,
+            vector=self.question_vector,
+            results=results,
+        )
+
+    async def prepare_context(self) -> None:
+        """Function that setup params and get context before answering"""
+
+        set_request_context(request_context=self.request_context)
 
         if self.input_params.deployement == Deployement.DOCUMENT:
-            self.chain.create_documents(documents=self.documents)
+            await self.chain.create_documents(documents=self.documents)
 
         if self.input_params.deployement in {
             Deployement.DOCUMENT,
@@ -134,13 +251,18 @@ class QA:
         }:
             await self.chain.get_context()
 
-        answer_raw: str = await self.chain.get_raw_answer()
+    def create_answer_pipeline(self, answer_raw: str) -> DagScheduler:
+        """Declare the stages following the raw answer as a dependency graph"""
 
-        answer_formated: str = await self.chain.get_formated_answer(
-            answer=answer_raw,
-        )
+        pipeline = DagScheduler(name="Answer")
+
+        pipeline.add_value(name="answer_raw", value=answer_raw)
 
-        # answer_formated: str = answer_raw
+        pipeline.add_stage(
+            name="answer_formated",
+            func=self.chain.get_formated_answer,
+            depends_on=["answer_raw"],
+        )
 
         if self.input_params.deployement in {
             Deployement.DOCUMENT,
@@ -149,27 +271,165 @@ class QA:
             Deployement.WEB,
             Deployement.GLPI,
         }:
-            answer_sourced = await self.chain.get_sourced_answer(answer=answer_formated)
+            pipeline.add_stage(
+                name="context_embedded", func=self.chain.embed_context_chunks
+            )
+
+            async def source(answer_formated: str, _) -> str:
+                return await self.chain.get_sourced_answer(answer=answer_formated)
+
+            pipeline.add_stage(
+                name="answer_markdown",
+                func=source,
+                depends_on=["answer_formated", "context_embedded"],
+            )
 
         else:
-            answer_sourced = answer_formated
 
-        answer_html: str = self.chain.markdown_to_html(answer=answer_sourced)
+            async def source(answer_formated: str) -> str:
+                return answer_formated
+
+            pipeline.add_stage(
+                name="answer_markdown", func=source, depends_on=["answer_formated"]
+            )
 
-        follow_up_question: list[str] = await get_follow_up_questions(
-            question=self.user_input, answer=answer_raw, memory=self.memory_list
+        async def create_references(_) -> list[dict]:
+            return self.chain.create_references(
+                context_chunks=self.chain.context.context_list
+            )
+
+        pipeline.add_stage(
+            name="references", func=create_references, depends_on=["answer_markdown"]
         )
 
-        response: Dict = self.chain.create_json_response(
-            user_input=self.user_input,
-            answer_html=answer_html,
-            answer_raw=answer_raw,
-            answer_formated=answer_sourced,
-            context_chunks=self.chain.context.context_list,
-            memory_list=self.memory_list,
-            follow_up_question=follow_up_question,
+        async def markdown_to_html(answer_sourced: str) -> str:
+            return self.chain.markdown_to_html(answer=answer_sourced)
+
+        pipeline.add_stage(
+            name="answer_html", func=markdown_to_html, depends_on=["answer_markdown"]
+        )
+
+        async def follow_up_questions(answer_raw: str) -> list[str]:
+            return await get_follow_up_questions(
+                question=self.user_input, answer=answer_raw, memory=self.memory_list
+            )
+
+        pipeline.add_stage(
+            name="suggestedQuestions",
+            func=follow_up_questions,
+            depends_on=["answer_raw"],
+        )
+
+        async def create_json_response(
+            answer_raw: str,
+            answer_sourced: str,
+            answer_html: str,
+            follow_up_question: list[str],
+            references: list[dict],
+        ) -> Dict:
+            return self.chain.create_json_response(
+                user_input=self.user_input,
+                answer_html=answer_html,
+                answer_raw=answer_raw,
+                answer_formated=answer_sourced,
+                references=references,
+                memory_list=self.memory_list,
+                follow_up_question=follow_up_question,
+            )
+
+        pipeline.add_stage(
+            name="response",
+            func=create_json_response,
+            depends_on=[
+                "answer_raw",
+                "answer_markdown",
+                "answer_html",
+                "suggestedQuestions",
+                "references",
+            ],
         )
 
+        return pipeline
+
+    async def complete_answer(self, answer_raw: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Function that add format and sources to raw answer, yielding each stage result"""
+
+        pipeline: DagScheduler = self.create_answer_pipeline(answer_raw=answer_raw)
+
+        async for name, result in pipeline.iter_results():
+            if name in STREAMED_STAGES:
+                yield name, result
+
+    async def run_stream(self) -> AsyncIterator[str]:
+        """Function that stream raw answer tokens as SSE, then format, sources and follow up questions"""
+
+        start_time = time.time()
+
+        try:
+            cached_results: Optional[Dict[str, Any]] = await self.get_cached_results()
+
+            if cached_results:
+                for event, data in cached_results.items():
+                    yield sse_event(event=event, data=data)
+
+                logger.warning("Total time %f", time.time() - start_time)
+
+                return
+
+            await self.prepare_context()
+
+            answer_raw: str = ""
+
+            async for token in self.chain.stream_raw_answer():
+                answer_raw += token
+
+                yield sse_event(event="token", data=token)
+
+            logger.info("RAW ANSWER: %s", answer_raw)
+
+            yield sse_event(event="answer", data=answer_raw)
+
+            results: Dict[str, Any] = {"answer": answer_raw}
+
+            async for event, data in self.complete_answer(answer_raw=answer_raw):
+                results[event] = data
+
+                yield sse_event(event=event, data=data)
+
+            self.set_cached_results(results=results)
+
+        except Exception as e:
+            logger.error("Error streaming answer %s", e)
+
+            yield sse_event(event="error", data=EnvParam.ERROR_MESSAGE)
+
+        logger.warning("Total time %f", time.time() - start_time)
+
+    async def run(self) -> Dict:
+        """Function that create raw answser from user input and context, then add format and sources"""
+
+        start_time = time.time()
+
+        cached_results: Optional[Dict[str, Any]] = await self.get_cached_results()
+
+        if cached_results:
+            logger.warning("Total time %f", time.time() - start_time)
+
+            return cached_results["response"]
+
+        await self.prepare_context()
+
+        answer_raw: str = await self.chain.get_raw_answer()
+
+        results: Dict[str, Any] = {"answer": answer_raw}
+
+        async for event, data in self.complete_answer(answer_raw=answer_raw):
+            results[event] = data
+
+        self.set_cached_results(results=results)
+
+        response: Dict = results.get("response", {})
+
         now = datetime.now()
 
         timestamp = (
@@ -188,7 +448,7 @@ class QA:
         #        "deployment": response["deployement"],
         #        "userid": response["userid"],
         #        "useremail": response["useremail"],
-        #        "tokensUsed": str(token_counter.token),
+        #        "tokensUsed": str(self.request_context.token_counter.token),
         #        "timestamp": timestamp,
         #    },
         # )
@@ -1,16 +1,23 @@
 """Create all queries for chunks search"""
 
+import re
 import time
-import copy
 import asyncio
 import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+
+import numpy as np
 
 from pydantic import BaseModel
 
 from langchain.prompts import ChatPromptTemplate
+from langchain.schema.messages import SystemMessage
+
+from config.config import EnvParam
 
 from modules import logger
+from modules.cache import LruCache, hash_key
+from modules.distance import DistanceEngine
 
 from modules.llm import (
     create_chat_prompt,
@@ -19,6 +26,7 @@ from modules.llm import (
     llm_multiquery,
     llm_follow_up_question,
     llm_google_query,
+    llm_query_plan,
 )
 
 from modules.prompt import (
@@ -27,19 +35,168 @@ from modules.prompt import (
     multiquery_instruction,
     abstract_instruction,
     follow_up_instructions,
-    follow_up_system_prompt,
     google_query_instruction,
-    google_query_system_prompt,
+    query_plan_instruction,
 )
 
-from modules.embeddings import Embeddings
+from modules.embeddings import Embeddings, distance_engine
 
-from modules.extractor import ExtractorQueries
+from modules.extractor import ExtractorQueries, ExtractorQueryPlan
+from modules.request_context import get_request_context
 
 
 embeddings = Embeddings()
 
 
+class ExpansionDecision(BaseModel):
+    """Query expansions to run for one user input"""
+
+    is_standalone: bool = True
+
+    is_abstract: bool = True
+
+    reasons: list[str] = []
+
+
+class ExpansionClassifier:
+    """Local stage deciding which query expansions are worth a Llm call"""
+
+    def __init__(
+        self,
+        max_size: int,
+        similarity_threshold: float,
+        keyword_max_words: int,
+        distance_engine: DistanceEngine,
+    ) -> None:
+        self.past_questions = LruCache(max_size=max_size)
+
+        self.similarity_threshold: float = similarity_threshold
+
+        self.keyword_max_words: int = keyword_max_words
+
+        self.distance_engine: DistanceEngine = distance_engine
+
+        self.latencies: Dict[str, float] = {}
+
+    def is_keyword_query(self, user_input: str) -> bool:
+        """Short lookup without question, stepback queries add nothing"""
+
+        return (
+            "?" not in user_input
+            and len(re.findall(r"\w+", user_input)) <= self.keyword_max_words
+        )
+
+    def is_standalone_useless(self, vector: np.ndarray) -> bool:
+        """The most similar past question had its standalone rewrite rejected"""
+
+        past_questions: list[Tuple[np.ndarray, bool]] = self.past_questions.values()
+
+        if len(past_questions) == 0:
+            return False
+
+        similarities: np.ndarray = 1.0 - self.distance_engine.cosine_distance_matrix(
+            vectors_1=[vector],
+            vectors_2=[past_vector for past_vector, _ in past_questions],
+        )[0]
+
+        best_index: int = int(np.argmax(similarities))
+
+        return (
+            similarities[best_index] >= self.similarity_threshold
+            and not past_questions[best_index][1]
+        )
+
+    async def classify(
+        self, user_input: str, memory_list: Optional[List[Dict[str, str]]]
+    ) -> Tuple[ExpansionDecision, Optional[np.ndarray]]:
+        """Decide the expansions to run, with the input vector when it was needed"""
+
+        decision = ExpansionDecision()
+
+        vector: Optional[np.ndarray] = None
+
+        if not memory_list:
+            decision.is_standalone = False
+
+            decision.reasons.append("no chat history")
+
+        else:
+            try:
+                vector = (await embeddings.embedding_vectors(texts=[user_input]))[0]
+
+                if self.is_standalone_useless(vector=vector):
+                    decision.is_standalone = False
+
+                    decision.reasons.append("similar question kept its input")
+
+            except Exception as e:
+                logger.error("Error classifying query expansion %s", e)
+
+        if self.is_keyword_query(user_input=user_input):
+            decision.is_abstract = False
+
+            decision.reasons.append("keyword query")
+
+        return decision, vector
+
+    def add_question(
+        self, user_input: str, vector: np.ndarray, is_standalone_useful: bool
+    ) -> None:
+        """Remember if the standalone rewrite of a question was kept"""
+
+        self.past_questions.set(
+            hash_key(user_input),
+            (self.distance_engine.to_storage(vector), is_standalone_useful),
+        )
+
+    def add_latency(self, name: str, duration: float) -> None:
+        """Moving average of the duration of one expansion"""
+
+        previous: Optional[float] = self.latencies.get(name)
+
+        self.latencies[name] = (
+            duration if previous is None else 0.8 * previous + 0.2 * duration
+        )
+
+    def log_decision(self, decision: ExpansionDecision) -> None:
+        """Log the expansions skipped and the estimated latency saved"""
+
+        saved_latency: float = 0.0
+
+        saved_calls: int = 0
+
+        if not decision.is_standalone:
+            saved_latency += self.latencies.get("standalone", 0.0)
+
+            saved_calls += 1
+
+        if not decision.is_abstract:
+            saved_latency += max(
+                self.latencies.get("abstract", 0.0) - self.latencies.get("multi", 0.0),
+                0.0,
+            )
+
+            saved_calls += 1
+
+        logger.info(
+            "Expansion decision: standalone %s, abstract %s (%s), "
+            "%d Llm calls skipped, estimated latency saved %f",
+            decision.is_standalone,
+            decision.is_abstract,
+            ", ".join(decision.reasons) or "full expansion",
+            saved_calls,
+            saved_latency,
+        )
+
+
+expansion_classifier = ExpansionClassifier(
+    max_size=EnvParam.EXPANSION_MEMORY_SIZE,
+    similarity_threshold=EnvParam.EXPANSION_SIMILARITY,
+    keyword_max_words=EnvParam.EXPANSION_KEYWORD_MAX_WORDS,
+    distance_engine=distance_engine,
+)
+
+
 class Queries(BaseModel):
     """Class storing db queries"""
 
@@ -62,15 +219,15 @@ class Queries(BaseModel):
     async def get_standalone_user_input(self) -> str:
         """Function creating standalone user input according to the conversation"""
 
+        start_time = time.time()
+
         try:
             instruction: str = f"My query: {self.user_input}\n{standalone_instruction}"
 
-            llm_standalone.system_prompt_str = llm_standalone.system_prompt_str.format(
-                documents=self.documents_names
-            )
-
             standalone_prompt: ChatPromptTemplate = create_chat_prompt(
-                system_prompt=llm_standalone.system_prompt,
+                system_prompt=llm_standalone.get_system_prompt(
+                    documents=self.documents_names
+                ),
                 memory_list=self.memory_list,
                 context=documents_store_context.format(documents=self.documents_names),
                 instruction=instruction,
@@ -89,6 +246,19 @@ class Queries(BaseModel):
 
             standalone_query = self.user_input
 
+        standalone_query = await self.check_standalone_user_input(
+            standalone_query=standalone_query
+        )
+
+        expansion_classifier.add_latency(
+            name="standalone", duration=time.time() - start_time
+        )
+
+        return standalone_query
+
+    async def check_standalone_user_input(self, standalone_query: str) -> str:
+        """Keep the user input if the standalone query drifted too far from it"""
+
         distance: float = await embeddings.embedding_distance(
             text_1=self.user_input, text_2=standalone_query
         )
@@ -100,9 +270,71 @@ class Queries(BaseModel):
 
         return standalone_query
 
+    def is_query_plan(self) -> bool:
+        """Query plan mode is enabled for the deployement of the request"""
+
+        deployement = get_request_context().deployement
+
+        if not deployement:
+            return False
+
+        return deployement.value in EnvParam.QUERY_PLAN_DEPLOYMENTS
+
+    async def get_query_plan(self) -> Optional[Tuple[str, list[str], list[str]]]:
+        """Function creating standalone, sub and stepback queries in one Llm call"""
+
+        try:
+            instruction: str = f"My query: {self.user_input}\n{query_plan_instruction}"
+
+            query_plan_prompt: ChatPromptTemplate = create_chat_prompt(
+                system_prompt=llm_query_plan.get_system_prompt(
+                    documents=self.documents_names
+                ),
+                memory_list=self.memory_list,
+                context=None,
+                instruction=instruction,
+            )
+
+            query_plan: ExtractorQueryPlan = await llm_query_plan.inference_extractor(
+                prompt=query_plan_prompt, object=ExtractorQueryPlan
+            )
+
+        except Exception as e:
+            logger.error("Error creating query plan %s", e)
+
+            return None
+
+        standalone_query: str = await self.check_standalone_user_input(
+            standalone_query=query_plan.standalone_query.strip() or self.user_input
+        )
+
+        multi_queries: list[str] = [
+            sub_query.query for sub_query in query_plan.sub_queries
+        ][:3]
+
+        abstract_queries: list[str] = [
+            stepback_query.query for stepback_query in query_plan.stepback_queries
+        ][:3]
+
+        logger.info("Standalone query : %s", standalone_query)
+
+        logger.info("Multi queries :")
+
+        for query in multi_queries:
+            logger.info("\t%s", query)
+
+        logger.info("Abstract queries :")
+
+        for query in abstract_queries:
+            logger.info("\t%s", query)
+
+        return standalone_query, multi_queries, abstract_queries
+
     async def get_multi_queries(self, user_input_standalone: str) -> list[str]:
         """Function spliting user query in X sub queries"""
 
+        start_time = time.time()
+
         try:
             instruction: str = (
                 f"Query: {user_input_standalone}\n{multiquery_instruction}"
@@ -141,11 +373,17 @@ class Queries(BaseModel):
         for query in multi_queries:
             logger.info("\t%s", query)
 
+        expansion_classifier.add_latency(
+            name="multi", duration=time.time() - start_time
+        )
+
         return multi_queries
 
     async def get_abstract_queries(self, user_input_standalone: str) -> list[str]:
         """Function creating abstract query from user query"""
 
+        start_time = time.time()
+
         try:
             instruction: str = f"Query: {user_input_standalone}\n{abstract_instruction}"
 
@@ -182,6 +420,10 @@ class Queries(BaseModel):
 
             abstract_queries = []
 
+        expansion_classifier.add_latency(
+            name="abstract", duration=time.time() - start_time
+        )
+
         return abstract_queries
 
     async def get_google_queries(self, user_input_standalone: str) -> list[str]:
@@ -195,19 +437,21 @@ class Queries(BaseModel):
         yesterday_str = previous_day.strftime("%A, %d %B %Y")
         tomorow_str = next_day.strftime("%A, %d %B %Y")
 
-        llm_google_query.system_prompt_str = copy.deepcopy(
-            google_query_system_prompt
-        ).format(day_str=day_str, tomorow_str=tomorow_str, yesterday_str=yesterday_str)
+        google_system_prompt: Optional[
+            SystemMessage
+        ] = llm_google_query.get_system_prompt(
+            day_str=day_str, tomorow_str=tomorow_str, yesterday_str=yesterday_str
+        )
 
-        instruction = copy.deepcopy(google_query_instruction).format(day_str=day_str)
+        instruction = google_query_instruction.format(day_str=day_str)
 
-        logger.warning(llm_google_query.system_prompt_str)
+        logger.warning(google_system_prompt)
 
         logger.warning(instruction)
 
         try:
             google_prompt: ChatPromptTemplate = create_chat_prompt(
-                system_prompt=llm_google_query.system_prompt,
+                system_prompt=google_system_prompt,
                 memory_list=None,
                 context=user_input_standalone,
                 instruction=instruction,
@@ -229,6 +473,8 @@ class Queries(BaseModel):
 
         start_time = time.time()
 
+        query_mode: str = "google"
+
         if self.is_google:
             multi_queries: list[str] = await self.get_multi_queries(
                 user_input_standalone=self.user_input
@@ -250,12 +496,63 @@ class Queries(BaseModel):
             logger.info("Google queries: %s", self.all_queries)
 
         else:
-            user_input_standalone: str = await self.get_standalone_user_input()
+            query_plan: Optional[Tuple[str, list[str], list[str]]] = None
 
-            multi_queries, abstract_queries = await asyncio.gather(
-                self.get_multi_queries(user_input_standalone=user_input_standalone),
-                self.get_abstract_queries(user_input_standalone=user_input_standalone),
-            )
+            if self.is_query_plan():
+                query_plan = await self.get_query_plan()
+
+            if query_plan:
+                query_mode = "query plan"
+
+                user_input_standalone, multi_queries, abstract_queries = query_plan
+
+            else:
+                decision, vector = await expansion_classifier.classify(
+                    user_input=self.user_input, memory_list=self.memory_list
+                )
+
+                expansion_classifier.log_decision(decision=decision)
+
+                if decision.is_standalone:
+                    user_input_standalone = await self.get_standalone_user_input()
+
+                    if vector is not None:
+                        expansion_classifier.add_question(
+                            user_input=self.user_input,
+                            vector=vector,
+                            is_standalone_useful=user_input_standalone
+                            != self.user_input,
+                        )
+
+                else:
+                    user_input_standalone = self.user_input
+
+                if decision.is_abstract:
+                    multi_queries, abstract_queries = await asyncio.gather(
+                        self.get_multi_queries(
+                            user_input_standalone=user_input_standalone
+                        ),
+                        self.get_abstract_queries(
+                            user_input_standalone=user_input_standalone
+                        ),
+                    )
+
+                else:
+                    multi_queries = await self.get_multi_queries(
+                        user_input_standalone=user_input_standalone
+                    )
+
+                    abstract_queries = []
+
+                query_mode = " + ".join(
+                    call
+                    for call, is_called in [
+                        ("standalone", decision.is_standalone),
+                        ("multi", True),
+                        ("abstract", decision.is_abstract),
+                    ]
+                    if is_called
+                )
 
             self.multi_queries = multi_queries
             self.abstract_queries = abstract_queries
@@ -274,7 +571,7 @@ class Queries(BaseModel):
             self.all_queries[i] = query.strip()
             logger.warning("-\t %s", query)
 
-        logger.warning("Query time %f", time.time() - start_time)
+        logger.warning("Query time %f with %s", time.time() - start_time, query_mode)
 
 
 async def get_follow_up_questions(
@@ -287,12 +584,10 @@ async def get_follow_up_questions(
     try:
         instruction: str = follow_up_instructions
 
-        llm_follow_up_question.system_prompt_str = copy.deepcopy(
-            follow_up_system_prompt
-        ).format(question=question, answer=answer)
-
         follow_up_prompt: ChatPromptTemplate = create_chat_prompt(
-            system_prompt=llm_follow_up_question.system_prompt,
+            system_prompt=llm_follow_up_question.get_system_prompt(
+                question=question, answer=answer
+            ),
             memory_list=memory,
             context=question,
             ai_answer=answer,
@@ -0,0 +1,50 @@
+"""Module with the state of the request being handled"""
+
+from contextvars import ContextVar
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from config.config import EnvParam
+
+from modules.token_counter import TokenCounter
+from modules.input_params import Deployement
+
+
+class RequestContext(BaseModel):
+    """Params of one request, replacing the global EnvParam writes"""
+
+    deployement: Optional[Deployement] = None
+
+    is_use_gpt_4: bool = EnvParam.USE_GPT_4
+
+    temperature: float = EnvParam.USER_TEMPERATURE
+
+    nb_files_for_chunks: int = EnvParam.NB_FILES_FOR_CHUNKS
+
+    nb_chunk_for_context: int = EnvParam.NB_CHUNK_FOR_CONTEXT
+
+    token_counter: TokenCounter = Field(default_factory=lambda: TokenCounter(token=0))
+
+
+request_context_var: ContextVar[RequestContext] = ContextVar("request_context")
+
+
+def set_request_context(request_context: RequestContext) -> None:
+    """Set the state of the request handled by the current task"""
+
+    request_context_var.set(request_context)
+
+
+def get_request_context() -> RequestContext:
+    """Get the state of the request handled by the current task"""
+
+    try:
+        return request_context_var.get()
+
+    except LookupError:
+        request_context = RequestContext()
+
+        request_context_var.set(request_context)
+
+        return request_context
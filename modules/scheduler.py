@@ -0,0 +1,171 @@
+"""Module running pipeline stages as a dependency graph"""
+
+import time
+import asyncio
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from modules import logger
+
+
+class Stage:
+    """One stage of the pipeline and the stages it needs"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        depends_on: List[str],
+    ) -> None:
+        self.name: str = name
+
+        self.func: Callable[..., Awaitable[Any]] = func
+
+        self.depends_on: List[str] = depends_on
+
+
+class DagScheduler:
+    """Start each stage as soon as all its inputs are ready"""
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+
+        self.stages: Dict[str, Stage] = {}
+
+        self.values: Dict[str, Any] = {}
+
+        self.timings: Dict[str, float] = {}
+
+    def add_value(self, name: str, value: Any) -> None:
+        """Add an input already computed, usable as dependency"""
+
+        self.values[name] = value
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        depends_on: Optional[List[str]] = None,
+    ) -> None:
+        """Add a stage, func gets the dependencies results in order"""
+
+        self.stages[name] = Stage(
+            name=name, func=func, depends_on=list(depends_on or [])
+        )
+
+    def sorted_stages(self) -> List[Stage]:
+        """Stages in topological order"""
+
+        sorted_stages: List[Stage] = []
+
+        visited: Dict[str, bool] = {}
+
+        def visit(name: str) -> None:
+            if name in self.values or visited.get(name):
+                return
+
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name} in {self.name} pipeline")
+
+            if name in visited:
+                raise ValueError(f"Cycle on stage {name} in {self.name} pipeline")
+
+            visited[name] = False
+
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+
+            visited[name] = True
+
+            sorted_stages.append(self.stages[name])
+
+        for name in self.stages:
+            visit(name)
+
+        return sorted_stages
+
+    async def iter_results(self) -> AsyncIterator[Tuple[str, Any]]:
+        """Run all stages and yield (name, result) as each one finishes"""
+
+        start_time = time.time()
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def get_input(name: str) -> Any:
+            if name in self.values:
+                return self.values[name]
+
+            return await tasks[name]
+
+        async def run_stage(stage: Stage) -> Any:
+            try:
+                inputs = [await get_input(name) for name in stage.depends_on]
+
+                stage_start_time = time.time()
+
+                result = await stage.func(*inputs)
+
+                self.timings[stage.name] = time.time() - stage_start_time
+
+            except Exception as e:
+                await queue.put((stage.name, e, True))
+
+                raise
+
+            await queue.put((stage.name, result, False))
+
+            return result
+
+        for stage in self.sorted_stages():
+            tasks[stage.name] = asyncio.create_task(run_stage(stage))
+
+        try:
+            for _ in range(len(tasks)):
+                name, result, is_error = await queue.get()
+
+                if is_error:
+                    raise result
+
+                yield name, result
+
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        self.log_timings(total_time=time.time() - start_time)
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages and return all results"""
+
+        results: Dict[str, Any] = {}
+
+        async for name, result in self.iter_results():
+            results[name] = result
+
+        return results
+
+    def log_timings(self, total_time: float) -> None:
+        """Log the time of each stage and of the whole pipeline"""
+
+        for name, stage_time in self.timings.items():
+            logger.warning("%s pipeline, stage %s time %f", self.name, name, stage_time)
+
+        logger.warning(
+            "%s pipeline time %f (sum of stages %f)",
+            self.name,
+            total_time,
+            sum(self.timings.values()),
+        )
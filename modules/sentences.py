@@ -0,0 +1,108 @@
+"""Process-wide sentence segmentation shared by all the splits"""
+
+import re
+import threading
+from typing import Any, Iterable, Optional
+
+import spacy
+
+from config.config import EnvParam
+
+from modules import logger
+
+
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+SPACY_EXCLUDED_COMPONENTS = ["tagger", "attribute_ruler", "lemmatizer", "ner"]
+
+
+class SentenceSegmenter:
+    """Trimmed spaCy pipeline loaded once, with a rule based fast mode"""
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int,
+        n_process: int,
+        fast_mode_min_chars: int,
+    ) -> None:
+        self.model_name: str = model_name
+
+        self.batch_size: int = batch_size
+
+        self.n_process: int = n_process
+
+        self.fast_mode_min_chars: int = fast_mode_min_chars
+
+        self.nlp: Optional[Any] = None
+
+        self.lock = threading.Lock()
+
+    def load(self) -> Any:
+        """Load the pipeline, keeping only the components giving sentences"""
+
+        with self.lock:
+            if self.nlp is not None:
+                return self.nlp
+
+            try:
+                self.nlp = spacy.load(
+                    self.model_name, exclude=SPACY_EXCLUDED_COMPONENTS
+                )
+
+            except OSError as e:
+                logger.error(
+                    "Error loading %s, using sentencizer %s", self.model_name, e
+                )
+
+                self.nlp = spacy.blank("en")
+
+                self.nlp.add_pipe("sentencizer")
+
+            self.nlp.max_length = max(self.nlp.max_length, self.fast_mode_min_chars)
+
+            logger.info("Sentence pipeline loaded %s", self.nlp.pipe_names)
+
+            return self.nlp
+
+    def get_ends_fast(self, text: str) -> list[int]:
+        """Rule based sentence ends on punctuation and blank lines"""
+
+        return [match.end() for match in SENTENCE_END_PATTERN.finditer(text)]
+
+    def get_ends_many(self, texts: list[str]) -> list[list[int]]:
+        """Char offsets where each sentence of each text ends, small texts are
+        batched through nlp.pipe"""
+
+        sentence_ends: list[list[int]] = [[] for _ in texts]
+
+        spacy_indexes: list[int] = []
+
+        for index, text in enumerate(texts):
+            if len(text) >= self.fast_mode_min_chars:
+                sentence_ends[index] = self.get_ends_fast(text=text)
+
+            else:
+                spacy_indexes.append(index)
+
+        if spacy_indexes:
+            nlp = self.load()
+
+            docs: Iterable = nlp.pipe(
+                (texts[index] for index in spacy_indexes),
+                batch_size=self.batch_size,
+                n_process=self.n_process,
+            )
+
+            for index, doc in zip(spacy_indexes, docs):
+                sentence_ends[index] = [sentence.end_char for sentence in doc.sents]
+
+        return sentence_ends
+
+
+sentence_segmenter = SentenceSegmenter(
+    model_name=EnvParam.SPACY_MODEL,
+    batch_size=EnvParam.SPACY_BATCH_SIZE,
+    n_process=EnvParam.SPACY_N_PROCESS,
+    fast_mode_min_chars=EnvParam.SPACY_FAST_MODE_MIN_CHARS,
+)
@@ -0,0 +1,276 @@
+"""Long-lived HTTP client shared by all the Serper calls"""
+
+import json
+import time
+import asyncio
+import importlib.util
+from typing import Optional
+
+import httpx
+
+from config.config import EnvParam
+
+from modules import logger
+from modules.cache import LruCache, SqliteCache, hash_key
+from modules.llm_clients import CountingTransport, HttpPoolStats
+
+
+class SerperCache:
+    """Serper responses with a TTL and a stale window, in memory and on disk"""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        stale_seconds: float,
+        db_path: Optional[str] = None,
+    ) -> None:
+        self.memory_cache = LruCache(max_size=max_size)
+
+        self.ttl_seconds: float = ttl_seconds
+
+        self.stale_seconds: float = stale_seconds
+
+        self.disk_cache: Optional[SqliteCache] = None
+
+        if db_path:
+            try:
+                self.disk_cache = SqliteCache(db_path=db_path, table="serper")
+
+            except Exception as e:
+                logger.error("Error opening serper disk cache %s", e)
+
+    def get_key(self, url: str, query: str, gl: str, hl: str) -> str:
+        """Key of one Serper call"""
+
+        return hash_key(url, query, gl, hl)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Entry with its creation time, None if missing or too old to be served"""
+
+        entry: Optional[dict] = self.memory_cache.get(key)
+
+        if entry is None and self.disk_cache:
+            raw_entry: Optional[bytes] = self.disk_cache.get(key)
+
+            if raw_entry is not None:
+                self.memory_cache.stats.disk_hits += 1
+
+                entry = json.loads(raw_entry)
+
+                self.memory_cache.set(key, entry)
+
+        if entry is None:
+            return None
+
+        if self.get_age(entry=entry) >= self.ttl_seconds + self.stale_seconds:
+            self.memory_cache.delete(key)
+
+            return None
+
+        return entry
+
+    def get_age(self, entry: dict) -> float:
+        """Seconds since the entry was fetched"""
+
+        return time.time() - entry["created_at"]
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Entry can be served without refreshing it"""
+
+        return self.get_age(entry=entry) < self.ttl_seconds
+
+    def set(self, key: str, response: dict) -> None:
+        """Store a Serper response"""
+
+        entry: dict = {"created_at": time.time(), "response": response}
+
+        self.memory_cache.set(key, entry)
+
+        if self.disk_cache:
+            try:
+                self.disk_cache.set(
+                    key, json.dumps(entry, ensure_ascii=False).encode("utf-8")
+                )
+
+            except Exception as e:
+                logger.error("Error writing serper disk cache %s", e)
+
+    def stats(self) -> dict:
+        """Cache counters, used to size the cache"""
+
+        return {
+            "size": len(self.memory_cache),
+            "max_size": self.memory_cache.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "is_disk_enabled": self.disk_cache is not None,
+            **self.memory_cache.stats.model_dump(),
+        }
+
+
+class SerperClient:
+    """Keep-alive HTTP/2 connection pool to Serper with bounded concurrency"""
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        max_concurrent_requests: int,
+        timeout: float,
+        cache: SerperCache,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+        self.max_concurrent_requests: int = max_concurrent_requests
+
+        self.timeout: float = timeout
+
+        self.is_http2: bool = importlib.util.find_spec("h2") is not None
+
+        self.http_client: Optional[httpx.AsyncClient] = None
+
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+        self.pool_stats = HttpPoolStats()
+
+        self.cache: SerperCache = cache
+
+        self.refresh_tasks: dict[str, asyncio.Task] = {}
+
+    def start(self) -> None:
+        """Open the connection pool (app startup)"""
+
+        self.get_http_client()
+
+        logger.info("Serper connection pool opened, http2 %s", self.is_http2)
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """Connection pool, opened if missing"""
+
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = httpx.AsyncClient(
+                transport=CountingTransport(
+                    transport=httpx.AsyncHTTPTransport(
+                        limits=self.limits, http2=self.is_http2
+                    ),
+                    stats=self.pool_stats,
+                ),
+                limits=self.limits,
+                timeout=self.timeout,
+                headers={
+                    "X-API-KEY": EnvParam.GOOGLE_SERPER_API,
+                    "Content-Type": "application/json",
+                },
+            )
+
+            self.semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        return self.http_client
+
+    async def post(self, url: str, payload: str) -> dict:
+        """Post a json payload to Serper and get the json response"""
+
+        http_client: httpx.AsyncClient = self.get_http_client()
+
+        async with self.semaphore:
+            response: httpx.Response = await http_client.post(url, content=payload)
+
+        response.raise_for_status()
+
+        return response.json()
+
+    async def search(self, url: str, query: str, gl: str, hl: str) -> dict:
+        """Serper response from the cache, refreshed in background once stale"""
+
+        key: str = self.cache.get_key(url=url, query=query, gl=gl, hl=hl)
+
+        entry: Optional[dict] = self.cache.get(key=key)
+
+        if entry is not None:
+            if not self.cache.is_fresh(entry=entry) and key not in self.refresh_tasks:
+                logger.info("Serper cache stale for %s, refreshing", query)
+
+                self.refresh_tasks[key] = asyncio.create_task(
+                    self.revalidate(key=key, url=url, query=query, gl=gl, hl=hl)
+                )
+
+            return entry["response"]
+
+        return await self.refresh(key=key, url=url, query=query, gl=gl, hl=hl)
+
+    async def refresh(self, key: str, url: str, query: str, gl: str, hl: str) -> dict:
+        """Call Serper and store the response"""
+
+        try:
+            response: dict = await self.post(
+                url=url, payload=json.dumps({"q": query, "gl": gl, "hl": hl})
+            )
+
+        except Exception as e:
+            logger.error("Error calling serper for %s => %s", query, e)
+
+            raise
+
+        self.cache.set(key=key, response=response)
+
+        return response
+
+    async def revalidate(
+        self, key: str, url: str, query: str, gl: str, hl: str
+    ) -> None:
+        """Refresh a stale entry in background, keeping it if Serper fails"""
+
+        try:
+            await self.refresh(key=key, url=url, query=query, gl=gl, hl=hl)
+
+        except Exception:
+            pass
+
+        finally:
+            self.refresh_tasks.pop(key, None)
+
+    async def aclose(self) -> None:
+        """Close the connection pool (app shutdown)"""
+
+        for refresh_task in list(self.refresh_tasks.values()):
+            refresh_task.cancel()
+
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+        self.http_client = None
+
+        logger.info("Serper connection pool closed")
+
+    def stats(self) -> dict:
+        """Pool usage, used to size it"""
+
+        return {
+            "is_http2": self.is_http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "max_concurrent_requests": self.max_concurrent_requests,
+            **self.pool_stats.model_dump(),
+            "cache": self.cache.stats(),
+        }
+
+
+serper_client = SerperClient(
+    max_connections=EnvParam.SERPER_MAX_CONNECTIONS,
+    max_keepalive_connections=EnvParam.SERPER_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=EnvParam.SERPER_KEEPALIVE_EXPIRY,
+    max_concurrent_requests=EnvParam.SERPER_MAX_CONCURRENT_REQUESTS,
+    timeout=EnvParam.SERPER_TIMEOUT,
+    cache=SerperCache(
+        max_size=EnvParam.SERPER_CACHE_SIZE,
+        ttl_seconds=EnvParam.SERPER_CACHE_TTL_SECONDS,
+        stale_seconds=EnvParam.SERPER_CACHE_STALE_SECONDS,
+        db_path=EnvParam.SERPER_CACHE_DB_PATH,
+    ),
+)
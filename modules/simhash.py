@@ -0,0 +1,53 @@
+"""SimHash fingerprints to detect near-duplicate chunks"""
+
+import re
+import hashlib
+
+import numpy as np
+
+
+WORD_PATTERN = re.compile(r"\w+")
+
+SHINGLE_SIZE = 3
+
+
+def simhash(text: str) -> int:
+    """64 bits fingerprint of the word shingles of a text"""
+
+    words: list[str] = WORD_PATTERN.findall(text.lower())
+
+    shingles: list[str] = [
+        " ".join(words[index : index + SHINGLE_SIZE])
+        for index in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    ]
+
+    hashes = np.frombuffer(
+        b"".join(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+            for shingle in shingles
+        ),
+        dtype=np.uint8,
+    ).reshape(len(shingles), 8)
+
+    bits: np.ndarray = np.unpackbits(hashes, axis=1).astype(np.int32)
+
+    votes: np.ndarray = (2 * bits - 1).sum(axis=0)
+
+    return int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+
+
+def hamming_distance(fingerprint_1: int, fingerprint_2: int) -> int:
+    """Number of different bits beetween two fingerprints"""
+
+    return (fingerprint_1 ^ fingerprint_2).bit_count()
+
+
+def is_near_duplicate(
+    fingerprint: int, fingerprints: list[int], max_distance: int
+) -> bool:
+    """The fingerprint is close to one of the fingerprints already seen"""
+
+    return any(
+        hamming_distance(fingerprint, seen_fingerprint) <= max_distance
+        for seen_fingerprint in fingerprints
+    )
@@ -2,15 +2,15 @@
 
 import re
 import time
-import asyncio
-from typing import List, Tuple
+from typing import List, Tuple, Optional
 
+import numpy as np
 
 from config.config import EnvParam
 
 from modules import logger
 from modules.context import Context
-from modules.embeddings import Embeddings
+from modules.embeddings import Embeddings, distance_engine
 
 if EnvParam.USE_AZURE:
     if EnvParam.EMBEDDING_MODEL_AZURE in {"text-embedding-ada-002"}:
@@ -50,49 +50,16 @@ class Sourcer:
     def __init__(self, context: Context) -> None:
         self.context: Context = context
 
-    def split_and_merge_near_limit(self, text: str, char: str, limit: int) -> list[str]:
-        """Split and merge to the limit"""
-
-        # parts = text.split(char)
-
-        # merged_parts = []
-
-        # current_part = parts[0]
-
-        # for part in parts[1:]:
-        #     if token_count(current_part + char + part) > limit:
-        #         merged_parts.append(current_part)
-
-        #         current_part = part
-        #     else:
-        #         current_part += char + part
-
-        # merged_parts.append(current_part)
-
-        return [text]  # merged_parts
-
-    async def calculate_similare_source(self, sentence: str) -> List[int]:
-        """Function that calculate similare source"""
-
-        score_source_list: List[Tuple[float, int]] = []
+    def calculate_similare_source(self, distances: np.ndarray) -> List[int]:
+        """Function that select sources from the distances beetween one sentence and all sources"""
 
         source_match_list: List[int] = []
 
-        for index_source, source in enumerate(self.context.context_list):
-            scores_source: list[float] = [10]
-
-            for source_split in self.split_and_merge_near_limit(
-                text=source.content, char="\n", limit=500
-            ):
-                score_source: float = await embeddings.embedding_distance(
-                    text_1=sentence, text_2=source_split
-                )
-
-                scores_source.append(score_source)
-
-            score_source_list.append((min(scores_source), index_source))
-
-        score_source_list = sorted(score_source_list, key=lambda x: x[0], reverse=False)
+        score_source_list: List[Tuple[float, int]] = sorted(
+            [(float(distance), index) for index, distance in enumerate(distances)],
+            key=lambda x: x[0],
+            reverse=False,
+        )
 
         best_source: float = score_source_list[0][0]
 
@@ -112,29 +79,55 @@ class Sourcer:
 
         return source_match_list
 
-    async def get_similare_source(
-        self, sentence: str, index: int
-    ) -> Tuple[list[int], int]:
-        """Function that get similare source"""
+    def clean_sentence(self, sentence: str) -> Optional[str]:
+        """Clean sentence before sourcing, return None if it must not be sourced"""
 
-        source_list_match: List[int] = []
+        sentence_clean: str = sentence.strip().replace("\n\n", "\n").replace("  ", " ")
 
-        try:
-            sentence_clean: str = (
-                sentence.strip().replace("\n\n", "\n").replace("  ", " ")
-            )
+        is_list_index = bool(re.fullmatch(r"[ \n][a-zA-Z0-9]", sentence[-2:]))
+
+        if len(sentence_clean) > 5 and not is_list_index:
+            return sentence_clean
 
-            is_list_index = bool(re.fullmatch(r"[ \n][a-zA-Z0-9]", sentence[-2:]))
+        return None
 
-            if len(sentence_clean) > 5 and not is_list_index:
-                source_list_match = await self.calculate_similare_source(
-                    sentence=sentence_clean
+    async def get_similare_sources(self, sentences: List[str]) -> List[List[int]]:
+        """Function that get similare sources for all sentences with one batched embedding call"""
+
+        sources_used_list: List[List[int]] = [[] for _ in sentences]
+
+        sentences_to_source: List[Tuple[int, str]] = []
+
+        for index, sentence in enumerate(sentences):
+            sentence_clean: Optional[str] = self.clean_sentence(sentence=sentence)
+
+            if sentence_clean:
+                sentences_to_source.append((index, sentence_clean))
+
+        if len(sentences_to_source) == 0 or len(self.context.context_list) == 0:
+            return sources_used_list
+
+        sources: List[str] = [chunk.content for chunk in self.context.context_list]
+
+        vectors: List[np.ndarray] = await embeddings.embedding_vectors(
+            texts=[sentence for _, sentence in sentences_to_source] + sources
+        )
+
+        distances: np.ndarray = distance_engine.cosine_distance_matrix(
+            vectors_1=vectors[: len(sentences_to_source)],
+            vectors_2=vectors[len(sentences_to_source) :],
+        )
+
+        for row, (index, sentence) in enumerate(sentences_to_source):
+            try:
+                sources_used_list[index] = self.calculate_similare_source(
+                    distances=distances[row]
                 )
 
-        except Exception as e:
-            logger.error("Error sourcing sentence %s. %s", sentence, e)
+            except Exception as e:
+                logger.error("Error sourcing sentence %s. %s", sentence, e)
 
-        return source_list_match, index
+        return sources_used_list
 
     def add_source_to_sentence(self, sentence: str, source_list: List[int]) -> str:
         """Add str source to the end of sentence"""
@@ -197,24 +190,11 @@ class Sourcer:
 
         sentences: list[str] = self.split_text(text=text)
 
-        sources_used_list_and_index: list[Tuple[list[int], int]] = []
-
         try:
-            coroutines = [
-                self.get_similare_source(sentence=sentence, index=index)
-                for index, sentence in enumerate(sentences)
-            ]
-
-            sources_used_list_and_index = await asyncio.gather(*coroutines)
-
-            sources_used_list_and_index = sorted(
-                sources_used_list_and_index, key=lambda x: x[1]
+            sources_used_list: list[list[int]] = await self.get_similare_sources(
+                sentences=sentences
             )
 
-            sources_used_list: list[list[int]] = [
-                source_list[0] for source_list in sources_used_list_and_index
-            ]
-
             logger.info("Source used: %s", str(sources_used_list))
 
             for source_sentences in sources_used_list:
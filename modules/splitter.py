@@ -1,15 +1,22 @@
 """Module for documents splitting"""
 
-from typing import Callable
-
-from cleantext import clean
+import re
+import bisect
+from typing import Optional
 
 from langchain.docstore.document import Document
-from langchain_text_splitters import CharacterTextSplitter, SpacyTextSplitter
 
 from modules import logger
 
-from modules.utils import token_count
+from modules.token_budget import encode_with_offsets
+from modules.sentences import sentence_segmenter
+from modules.text_cleaner import clean_text
+
+
+# Bump when the cleaning or the chunking changes, the stored indexes are rebuilt
+SPLITTER_VERSION = "3"
+
+PAGE_SEPARATOR = "\n\n"
 
 
 class Splitter:
@@ -17,33 +24,29 @@ class Splitter:
 
     def __init__(
         self,
-        counter: Callable[[str], int],
         chunk_size: int,
         seprators: list[str],
+        chunk_overlap: int = 0,
+        clean_slice_chars: int = 4000,
     ) -> None:
-        self.counter: Callable[[str], int] = counter
-
         self.chunk_size: int = chunk_size
 
         self.separators: list[str] = seprators
 
+        self.chunk_overlap: int = min(chunk_overlap, chunk_size // 2)
+
+        self.clean_slice_chars: int = clean_slice_chars
+
     def clean_string(self, text: str, is_clean_text: bool) -> str:
         """Function that remove unwanted char:
-        blank lines, two following space, multiple line return"""
+        blank lines, two following space, multiple line return,
+        cleaned by page sized slices"""
 
         if not is_clean_text:
             return text
 
         try:
-            cleaned_text = clean(
-                text,
-                fix_unicode=True,
-                keep_two_line_breaks=True,
-                lower=False,
-                to_ascii=True,
-                no_emoji=True,
-                lang="en",
-            )
+            cleaned_text = clean_text(text=text, slice_chars=self.clean_slice_chars)
 
         except Exception as e:
             logger.error("Error cleaning text before splitting : %s", e)
@@ -52,56 +55,206 @@ class Splitter:
 
         return cleaned_text
 
-    def split(self, docs: list[Document], is_clean_text: bool = True) -> list[Document]:
-        """Function which split text"""
+    def clean_pages(
+        self, text: str, page_offsets: list[int], is_clean_text: bool
+    ) -> tuple[str, list[int]]:
+        """Clean a paged text page by page, with the char offset where each
+        cleaned page starts"""
 
-        split_docs: list[Document] = []
+        if not is_clean_text:
+            return text, page_offsets
 
-        for doc in docs:
-            logger.info(
-                "Splitting %s (%d)",
-                doc.metadata["file_name"],
-                token_count(doc.page_content),
+        cleaned_pages: list[str] = []
+
+        cleaned_page_offsets: list[int] = []
+
+        offset: int = 0
+
+        for first_char, last_char in zip(
+            page_offsets, [*page_offsets[1:], len(text)]
+        ):
+            cleaned_page: str = self.clean_string(
+                text=text[first_char:last_char], is_clean_text=True
+            )
+
+            cleaned_pages.append(cleaned_page)
+
+            cleaned_page_offsets.append(offset)
+
+            offset += len(cleaned_page) + len(PAGE_SEPARATOR)
+
+        return PAGE_SEPARATOR.join(cleaned_pages), cleaned_page_offsets
+
+    def get_boundaries(self, text: str, sentence_ends: list[int]) -> list[list[int]]:
+        """Char offsets where a chunk may end, by separator priority then
+        sentence ends"""
+
+        boundaries: list[list[int]] = []
+
+        for separator in self.separators:
+            boundaries.append(
+                [
+                    match.end()
+                    for match in re.finditer(re.escape(separator) + "+", text)
+                ]
             )
 
-            chunks: list[str] = [
-                self.clean_string(text=doc.page_content, is_clean_text=is_clean_text)
+        boundaries.append(sentence_ends)
+
+        return boundaries
+
+    def split_tokens(
+        self,
+        text: str,
+        sentence_ends: list[int],
+        page_offsets: Optional[list[int]] = None,
+    ) -> list[tuple[str, int, Optional[int]]]:
+        """Cut a text tokenized once in chunks of at most chunk_size tokens,
+        ending on the best boundary, with chunk_overlap tokens of overlap, and
+        the page (from 1) where each chunk starts if the text is paged"""
+
+        tokens, offsets = encode_with_offsets(text=text)
+
+        nb_token: int = len(tokens)
+
+        token_boundaries: list[list[int]] = [
+            sorted({bisect.bisect_left(offsets, char_index) for char_index in ends})
+            for ends in self.get_boundaries(text=text, sentence_ends=sentence_ends)
+        ]
+
+        chunks: list[tuple[str, int, Optional[int]]] = []
+
+        start: int = 0
+
+        while start < nb_token:
+            end: int = min(start + self.chunk_size, nb_token)
+
+            if end < nb_token:
+                min_end: int = start + self.chunk_size // 2
+
+                for boundaries in token_boundaries:
+                    index: int = bisect.bisect_right(boundaries, end) - 1
+
+                    if index >= 0 and boundaries[index] > min_end:
+                        end = boundaries[index]
+
+                        break
+
+            chunk: str = text[
+                offsets[start] : offsets[end] if end < nb_token else len(text)
             ]
 
-            logger.info(
-                "Raw text clean for %s (%d)",
-                doc.metadata["file_name"],
-                token_count(chunks[0]),
+            page: Optional[int] = None
+
+            if page_offsets:
+                page = bisect.bisect_right(page_offsets, offsets[start])
+
+            if chunk.strip():
+                chunks.append((chunk, end - start, page))
+
+            if end >= nb_token:
+                break
+
+            start = self.get_next_start(
+                start=start, end=end, token_boundaries=token_boundaries
             )
 
-            logger.info("Nb de n in text doc %d", chunks[0].count("\n"))
+        return chunks
+
+    def get_next_start(
+        self, start: int, end: int, token_boundaries: list[list[int]]
+    ) -> int:
+        """Start of the chunk following [start, end): a boundary inside the
+        overlap, else the latest boundary before it, else a raw token offset"""
+
+        next_start: int = max(end - self.chunk_overlap, start + 1)
+
+        for boundaries in token_boundaries:
+            index: int = bisect.bisect_left(boundaries, next_start)
+
+            if index < len(boundaries) and boundaries[index] < end:
+                return boundaries[index]
+
+        previous_boundaries: list[int] = [
+            boundaries[index - 1]
+            for boundaries in token_boundaries
+            for index in [bisect.bisect_right(boundaries, next_start)]
+            if index > 0 and boundaries[index - 1] > start
+        ]
+
+        if previous_boundaries:
+            return max(previous_boundaries)
+
+        return next_start
+
+    def split(self, docs: list[Document], is_clean_text: bool = True) -> list[Document]:
+        """Function which split text in chunks of chunk_size tokens, the token
+        count and the page of each chunk are kept in its metadata"""
+
+        split_docs: list[Document] = []
 
-            try:
-                text_splitter_spacy = SpacyTextSplitter(chunk_size=1000)
+        cleaned_texts: list[str] = []
 
-                chunks = text_splitter_spacy.split_text(chunks[0])
+        page_offsets_by_doc: list[Optional[list[int]]] = []
 
-                logger.info("Text split for %s", doc.metadata["file_name"])
+        for doc in docs:
+            page_offsets: Optional[list[int]] = doc.metadata.get("page_offsets")
 
-            except Exception as e:
-                logger.error("Error creating chunk, will use langchain splitter %s", e)
+            if page_offsets:
+                cleaned_text, page_offsets = self.clean_pages(
+                    text=doc.page_content,
+                    page_offsets=page_offsets,
+                    is_clean_text=is_clean_text,
+                )
 
-                text_splitter_tiktoken = CharacterTextSplitter.from_tiktoken_encoder(
-                    encoding_name="cl100k_base", chunk_size=300, chunk_overlap=0
+            else:
+                cleaned_text = self.clean_string(
+                    text=doc.page_content, is_clean_text=is_clean_text
                 )
 
-                chunks = text_splitter_tiktoken.split_text(chunks[0])
+            cleaned_texts.append(cleaned_text)
+
+            page_offsets_by_doc.append(page_offsets)
+
+        for cleaned_text in cleaned_texts:
+            logger.info("Nb de n in text doc %d", cleaned_text.count("\n"))
+
+        sentence_ends_by_doc: list[list[int]]
+
+        try:
+            sentence_ends_by_doc = sentence_segmenter.get_ends_many(texts=cleaned_texts)
+
+        except Exception as e:
+            logger.error("Error segmenting sentences, will use separators only %s", e)
+
+            sentence_ends_by_doc = [[] for _ in cleaned_texts]
+
+        for index, doc in enumerate(docs):
+            chunks: list[tuple[str, int, Optional[int]]] = self.split_tokens(
+                text=cleaned_texts[index],
+                sentence_ends=sentence_ends_by_doc[index],
+                page_offsets=page_offsets_by_doc[index],
+            )
+
+            logger.info(
+                "Text split for %s (%d)",
+                doc.metadata["file_name"],
+                sum(nb_token for _, nb_token, _ in chunks),
+            )
 
-            for chunk in chunks:
-                try:
-                    logger.info("Chunk size => %d\n", len(chunk))
+            chunk_metadata: dict = {
+                key: value
+                for key, value in doc.metadata.items()
+                if key != "page_offsets"
+            }
 
-                    new_doc = Document(page_content=chunk, metadata=doc.metadata)
+            for chunk, nb_token, page in chunks:
+                metadata: dict = {**chunk_metadata, "nb_token": nb_token}
 
-                    split_docs.append(new_doc)
+                if page is not None:
+                    metadata["page"] = page
 
-                except Exception as e:
-                    logger.error("Error creating chunk after splitting %s", e)
+                split_docs.append(Document(page_content=chunk, metadata=metadata))
 
             logger.info("Chunks stored for %s", doc.metadata["file_name"])
 
@@ -0,0 +1,138 @@
+"""Text cleaning before splitting, with precompiled regex and translation tables"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterator, Optional
+
+
+ASCII_TABLE_MAX = 0x10000
+
+STRANGE_QUOTES: dict[int, str] = {
+    ord(char): "'" for char in "‘’‚‛′‵‹›"
+} | {ord(char): '"' for char in "“”„‟″‶«»"}
+
+LINE_BREAKS: dict[int, str] = {ord(char): "\n" for char in "\v\f\x85\u2028\u2029"}
+
+FRACTION_SLASH = "\u2044"
+
+CONTROL_CHARS: dict[int, None] = {
+    code_point: None
+    for code_point in [*range(0x00, 0x09), *range(0x0E, 0x20), 0x7F]
+}
+
+CARRIAGE_RETURN_PATTERN = re.compile(r"\r\n?")
+
+NON_ASCII_PATTERN = re.compile(r"[^\x00-\x7f]+")
+
+MULTI_SPACE_PATTERN = re.compile(r"[^\S\n]+")
+
+MULTI_LINE_BREAK_PATTERN = re.compile(r" ?\n(?: ?\n)+ ?")
+
+LINE_BREAK_PATTERN = re.compile(r" ?\n ?")
+
+WHITESPACE_PATTERN = re.compile(r"\s*")
+
+
+@lru_cache(maxsize=1)
+def get_ascii_table() -> dict[int, Optional[str]]:
+    """Translation of each char to its ascii decomposition, built once"""
+
+    table: dict[int, Optional[str]] = {}
+
+    for code_point in range(0x80, ASCII_TABLE_MAX):
+        decomposed_text: str = unicodedata.normalize("NFKD", chr(code_point))
+
+        if FRACTION_SLASH in decomposed_text:
+            # "3½" must become "3 1/2", not "312"
+            decomposed_text = " " + decomposed_text.replace(FRACTION_SLASH, "/")
+
+        ascii_text: str = decomposed_text.encode("ascii", "ignore").decode("ascii")
+
+        table[code_point] = ascii_text or None
+
+    table.update(CONTROL_CHARS)
+
+    table.update(STRANGE_QUOTES)
+
+    table.update(LINE_BREAKS)
+
+    table[ord(FRACTION_SLASH)] = "/"
+
+    return table
+
+
+def iter_slices(text: str, slice_chars: int) -> Iterator[str]:
+    """Page sized slices of text, cut after a line break and its blank chars"""
+
+    start: int = 0
+
+    while start < len(text):
+        line_break: int = text.find("\n", start + slice_chars)
+
+        if line_break == -1:
+            yield text[start:]
+
+            return
+
+        end: int = WHITESPACE_PATTERN.match(text, line_break).end()
+
+        yield text[start:end]
+
+        start = end
+
+
+def clean_slice(text: str) -> str:
+    """Same cleaning as clean-text with fix_unicode, to_ascii, no_emoji and
+    keep_two_line_breaks"""
+
+    text = CARRIAGE_RETURN_PATTERN.sub("\n", text).translate(get_ascii_table())
+
+    return normalize_whitespace(text=NON_ASCII_PATTERN.sub("", text))
+
+
+def normalize_whitespace(text: str) -> str:
+    """Each blank run becomes a space, a line break or two line breaks"""
+
+    text = MULTI_SPACE_PATTERN.sub(" ", text)
+
+    text = MULTI_LINE_BREAK_PATTERN.sub("\n\n", text)
+
+    return LINE_BREAK_PATTERN.sub("\n", text)
+
+
+def clean_slices(text: str, slice_chars: int) -> Iterator[str]:
+    """Cleaned slices of text, for a consumer that does not need it whole.
+    The blank run around each cut is normalized again once joined, as chars
+    removed at the start of a slice can leave it split in two"""
+
+    pending_whitespace: str = ""
+
+    for text_slice in iter_slices(text=text, slice_chars=slice_chars):
+        cleaned_slice: str = clean_slice(text=text_slice)
+
+        content: str = cleaned_slice.strip()
+
+        if not content:
+            pending_whitespace += cleaned_slice
+
+            continue
+
+        leading_end: int = len(cleaned_slice) - len(cleaned_slice.lstrip())
+
+        trailing_start: int = len(cleaned_slice.rstrip())
+
+        yield normalize_whitespace(
+            text=pending_whitespace + cleaned_slice[:leading_end]
+        ) + content
+
+        pending_whitespace = cleaned_slice[trailing_start:]
+
+    if pending_whitespace:
+        yield normalize_whitespace(text=pending_whitespace)
+
+
+def clean_text(text: str, slice_chars: int) -> str:
+    """Cleaned text, built slice by slice"""
+
+    return "".join(clean_slices(text=text, slice_chars=slice_chars)).strip()
@@ -0,0 +1,72 @@
+"""Module counting and cutting tokens with one cached encoder"""
+
+from functools import lru_cache
+
+import tiktoken
+
+
+ENCODING_NAME = "cl100k_base"
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    """Encoder loaded once per process"""
+
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+def encode(text: str) -> list[int]:
+    """Tokenize text"""
+
+    return get_encoding().encode(text, disallowed_special=())
+
+
+def encode_with_offsets(text: str) -> tuple[list[int], list[int]]:
+    """Tokenize text and get the char offset where each token starts"""
+
+    tokens: list[int] = encode(text=text)
+
+    _, offsets = get_encoding().decode_with_offsets(tokens)
+
+    return tokens, offsets
+
+
+def decode(tokens: list[int]) -> str:
+    """Convert tokens back to text, dropping a char cut in the middle"""
+
+    return get_encoding().decode_bytes(tokens).decode("utf-8", errors="ignore")
+
+
+def token_count(text: str) -> int:
+    """Function that count token in text"""
+
+    return len(encode(text=text))
+
+
+def token_counts(texts: list[str]) -> list[int]:
+    """Function that count token of many texts in one batched call"""
+
+    if len(texts) == 0:
+        return []
+
+    return [
+        len(tokens)
+        for tokens in get_encoding().encode_batch(texts, disallowed_special=())
+    ]
+
+
+def truncate_tokens(tokens: list[int], max_token: int) -> str:
+    """Text of the first max_token tokens"""
+
+    return decode(tokens=tokens[: max(max_token, 0)])
+
+
+def truncate_to_token(text: str, max_token: int) -> str:
+    """Cut text at the exact token boundary to match max_token size"""
+
+    tokens: list[int] = encode(text=text)
+
+    if len(tokens) <= max_token:
+        return text
+
+    return truncate_tokens(tokens=tokens, max_token=max_token)
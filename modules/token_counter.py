@@ -11,3 +11,5 @@ class TokenCounter(BaseModel):
     """
 
     token: int
+
+    saved_token: int = 0
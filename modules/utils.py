@@ -1,61 +1,46 @@
 """Modules which contains utils functions"""
 
-import tiktoken
+import json
 
 from bs4 import BeautifulSoup, NavigableString
 
 from modules import logger
+from modules.token_budget import encode, truncate_tokens, truncate_to_token
 
 from config.config import EnvParam
 
 
-def token_count(text: str) -> int:
-    """Function that count token in text"""
-
-    encoding = tiktoken.get_encoding("cl100k_base")
-
-    nb_token: int = len(encoding.encode(text))
-
-    return nb_token
-
-
 def reduce_until_token(text: str, max_token: int) -> str:
     """Cut text to match max_token size"""
 
-    nb_token = token_count(text=text)
-
-    while nb_token > int(max_token - 10):
-        pourcentage = 0.80
-
-        new_limit = int(len(text) * pourcentage)
-
-        text = text[:new_limit]
-
-        nb_token = token_count(text=text)
-
-    return text
+    return truncate_to_token(text=text, max_token=int(max_token - 10))
 
 
 def window_token_reducer(context: str) -> str:
     """Check context size and reduce according to llm windiw size"""
 
-    if token_count(context) > EnvParam.MAX_TOKEN_CONTEXT:
-        old_len: int = token_count(context)
+    tokens: list[int] = encode(text=context)
 
-        context = reduce_until_token(
-            text=context,
-            max_token=EnvParam.MAX_TOKEN_CONTEXT,
-        )
+    if len(tokens) > EnvParam.MAX_TOKEN_CONTEXT:
+        new_len: int = int(EnvParam.MAX_TOKEN_CONTEXT - 10)
+
+        context = truncate_tokens(tokens=tokens, max_token=new_len)
 
         logger.warning(
             "Reduce context from %d to %d",
-            old_len,
-            token_count(context),
+            len(tokens),
+            new_len,
         )
 
     return context
 
 
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event with json data"""
+
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 def save_result(index_question: int, html_answer: str, user_input: str, context: str):
     """Function that saves the QA result to a local folder."""
 
@@ -0,0 +1,96 @@
+"""Compare clean-text with modules.text_cleaner on the PDFs of test/conversion,
+run from the repository root: python test/conversion/benchmark_clean.py"""
+
+import os
+import sys
+import glob
+import time
+import difflib
+import tracemalloc
+
+import fitz
+from cleantext import clean
+
+sys.path.insert(0, os.getcwd())
+
+from modules.text_cleaner import clean_text, get_ascii_table  # noqa: E402
+
+NB_RUNS = 3
+
+SLICE_CHARS = 4000
+
+
+def clean_with_cleantext(text: str) -> str:
+    """Cleaning as done before by Splitter.clean_string"""
+
+    return clean(
+        text,
+        fix_unicode=True,
+        keep_two_line_breaks=True,
+        lower=False,
+        to_ascii=True,
+        no_emoji=True,
+        lang="en",
+    )
+
+
+def clean_with_text_cleaner(text: str) -> str:
+    """Cleaning by page sized slices"""
+
+    return clean_text(text=text, slice_chars=SLICE_CHARS)
+
+
+def benchmark(name: str, function, text: str) -> str:
+    """Best time and peak memory of a cleaning function"""
+
+    durations: list[float] = []
+
+    for _ in range(NB_RUNS):
+        start = time.perf_counter()
+
+        cleaned_text = function(text)
+
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+
+    function(text)
+
+    _, peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+
+    print(
+        f"  {name:<14} {min(durations) * 1000:9.1f} ms"
+        f" {len(text) / min(durations) / 1e6:7.2f} Mchar/s"
+        f" peak {peak / 1e6:7.2f} MB"
+    )
+
+    return cleaned_text
+
+
+get_ascii_table()
+
+for path in sorted(glob.glob("test/conversion/*.pdf")):
+    with fitz.open(path) as doc:
+        pdf_text = "".join(page.get_text() for page in doc)
+
+        nb_pages = len(doc)
+
+    print(f"{os.path.basename(path)} ({nb_pages} pages, {len(pdf_text)} chars)")
+
+    cleantext_result = benchmark("clean-text", clean_with_cleantext, pdf_text)
+
+    text_cleaner_result = benchmark("text_cleaner", clean_with_text_cleaner, pdf_text)
+
+    matcher = difflib.SequenceMatcher(
+        None, cleantext_result, text_cleaner_result, autojunk=False
+    )
+
+    print(f"  output similarity {matcher.ratio():.4f}")
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            print(
+                f"  {tag} {cleantext_result[i1:i2]!r} => {text_cleaner_result[j1:j2]!r}"
+            )
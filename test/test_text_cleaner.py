@@ -0,0 +1,34 @@
+"""Sliced cleaning must give the same text as cleaning the whole string,
+run from the repository root: python -m pytest test/test_text_cleaner.py"""
+
+import pytest
+
+from modules.text_cleaner import clean_slice, clean_text
+
+TEXTS = [
+    "a" * 10 + "\n \U0001F600 bcd",
+    "aaaa \U0001F600 \n\n \x01 bcd\r\n\r\n\r\nefg",
+    "This   is a sAmple   text, ¿•: 1234, and \U0001F60A emojis!!!\n\n\n"
+    "Fisrt tilte  \n   How is it ﬁne café “q” ½\n",
+    "line\n\U0001F600\n\U0001F600\nnext\t\t line\n \n \nlast  ",
+    "\n\n  \U0001F600  \n",
+    "",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("slice_chars", [1, 2, 3, 5, 8, 13, 4000])
+def test_sliced_cleaning_matches_whole_cleaning(text: str, slice_chars: int):
+    assert clean_text(text=text, slice_chars=slice_chars) == clean_slice(text).strip()
+
+
+def test_clean_slice_keeps_fractions():
+    assert (
+        clean_slice("3½ cups, ¼ inch, 1⁄8 turn") == "3 1/2 cups, 1/4 inch, 1/8 turn"
+    )
+
+
+def test_clean_slice_options():
+    assert (
+        clean_slice("“Café”  ﬁne \U0001F600\n\n\n\nnext") == '"Cafe" fine\n\nnext'
+    )